@@ -1,15 +1,92 @@
 import argparse
 import logging
+import os
+import shlex
+import sys
 
 import uvicorn
+from fastapi import FastAPI
 
-from alertdb.server import create_server
-from alertdb.storage import FileBackend, GoogleObjectStorageBackend
+from alertdb.server import (
+    DEFAULT_ALERT_CACHE_BYTES,
+    DEFAULT_IO_THREADS,
+    DEFAULT_MISSING_ALERT_TTL,
+    DEFAULT_SCHEMA_CACHE_TTL,
+    create_server,
+)
+from alertdb.storage import AlertDatabaseBackend, valid_id
 
 logger = logging.getLogger(__name__)
 
+# With more than one worker, uvicorn starts each worker process by importing
+# an application factory, so the command-line arguments are handed to the
+# workers through this environment variable. It can also be set directly to
+# run the server under another process manager, like gunicorn.
+ARGS_ENV_VAR = "ALERTDB_ARGS"
+
 
 def main():
+    parser = _build_parser()
+    args = parser.parse_args()
+
+    uvicorn_log_level = _configure_logging(args)
+
+    if args.workers < 0:
+        parser.error("--workers must not be negative")
+    if args.workers == 0:
+        # Backend calls run on each worker's thread pool, so a single process
+        # per core is enough to keep every core busy parsing requests.
+        args.workers = os.cpu_count() or 1
+
+    if args.workers == 1:
+        app = _create_app(parser, args)
+    else:
+        # Build the application once here anyway, so that configuration errors
+        # are reported before any workers start.
+        _create_app(parser, args)
+        os.environ[ARGS_ENV_VAR] = shlex.join(sys.argv[1:])
+        app = "alertdb.bin.alertdb:create_app"
+
+    logger.info(
+        "server initialized, running %d worker(s) at %s:%s",
+        args.workers,
+        args.listen_host,
+        args.listen_port,
+    )
+    uvicorn.run(
+        app,
+        factory=args.workers > 1,
+        host=args.listen_host,
+        port=args.listen_port,
+        workers=args.workers,
+        log_level=uvicorn_log_level,
+        access_log=args.access_log,
+        # Ask for these explicitly: uvicorn otherwise quietly falls back to
+        # the much slower asyncio loop and h11 parser if they aren't found.
+        loop="uvloop",
+        http="httptools",
+    )
+
+
+def create_app() -> FastAPI:
+    """
+    Create an alert database server from the command-line arguments in the
+    $ALERTDB_ARGS environment variable.
+
+    This is the application factory used by worker processes. For example,
+    to run under gunicorn:
+
+        ALERTDB_ARGS="--backend=google-cloud --gcp-project=my-project" \\
+            gunicorn -k uvicorn.workers.UvicornWorker -w 9 \\
+            'alertdb.bin.alertdb:create_app()'
+    """
+    parser = _build_parser()
+    args = parser.parse_args(shlex.split(os.environ.get(ARGS_ENV_VAR, "")))
+    _configure_logging(args)
+    return _create_app(parser, args)
+
+
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         "alertdb",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -27,10 +104,16 @@ def main():
         default=5000,
         help="host port to listen on for requests",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of server processes to run; 0 runs one per CPU core",
+    )
     parser.add_argument(
         "--backend",
         type=str,
-        choices=("local-files", "google-cloud"),
+        choices=("local-files", "google-cloud", "s3"),
         default="local-files",
         help="backend to use to source alerts",
     )
@@ -58,23 +141,97 @@ def main():
         default="alert-schemas",
         help="when using the google-cloud backend, the name of the GCS bucket for alert schemas",
     )
+    parser.add_argument(
+        "--gcp-parallel-chunk-bytes",
+        type=int,
+        default=0,
+        help="when using the google-cloud backend, download alerts larger than this as parallel ranges of this size when fetching them whole, for batch requests and prefetching; single alert requests are streamed instead. 0 disables this",
+    )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        type=str,
+        default="https://storage.googleapis.com",
+        help="when using the s3 backend, the URL of the S3-compatible API; the default is GCS's",
+    )
+    parser.add_argument(
+        "--s3-bucket-alerts",
+        type=str,
+        default="alert-packets",
+        help="when using the s3 backend, the name of the bucket for alert packets",
+    )
+    parser.add_argument(
+        "--s3-bucket-schemas",
+        type=str,
+        default="alert-schemas",
+        help="when using the s3 backend, the name of the bucket for alert schemas",
+    )
+    parser.add_argument(
+        "--alert-cache-bytes",
+        type=int,
+        default=DEFAULT_ALERT_CACHE_BYTES,
+        help="maximum total size of alert payloads to cache in memory; 0 disables the cache",
+    )
+    parser.add_argument(
+        "--schema-cache-ttl",
+        type=float,
+        default=DEFAULT_SCHEMA_CACHE_TTL,
+        help="number of seconds to serve a schema from memory before refetching it",
+    )
+    parser.add_argument(
+        "--missing-alert-ttl",
+        type=float,
+        default=DEFAULT_MISSING_ALERT_TTL,
+        help="number of seconds to remember, and let clients cache, that an alert or schema is missing",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=DEFAULT_IO_THREADS,
+        help="number of threads per worker making backend requests; bounds the backend requests in flight",
+    )
+    parser.add_argument(
+        "--prefetch-stride",
+        type=int,
+        default=0,
+        help="on a cache miss for an alert, also prefetch this many alerts with the following IDs",
+    )
+    parser.add_argument(
+        "--prefetch-ids-file",
+        type=str,
+        default=None,
+        help="file listing alert IDs, one per line, to fetch into the cache when the server starts",
+    )
+    parser.add_argument(
+        "--access-log",
+        action="store_true",
+        help="log every request; this costs noticeable throughput under load",
+    )
     parser.add_argument("--verbose", action="store_true", help="log a bunch")
     parser.add_argument("--debug", action="store_true", help="log even more")
+    return parser
 
-    args = parser.parse_args()
 
+def _configure_logging(args: argparse.Namespace) -> str:
+    """
+    Set up logging, returning the log level to pass to uvicorn.
+    """
     if args.debug:
-        uvicorn_log_level = "debug"
         logging.basicConfig(level=logging.DEBUG)
+        return "debug"
     elif args.verbose:
-        uvicorn_log_level = "info"
         logging.basicConfig(level=logging.INFO)
+        return "info"
     else:
-        uvicorn_log_level = "info"
         logging.basicConfig(level=logging.WARNING)
+        return "info"
 
+
+def _create_app(parser: argparse.ArgumentParser, args: argparse.Namespace) -> FastAPI:
     logger.info("initializing alert database server backend")
 
+    if args.io_threads < 1:
+        parser.error("--io-threads must be at least 1")
+
     # Configure the right backend
     if args.backend == "local-files":
         logger.info("using local-files backend")
@@ -83,7 +240,9 @@ def main():
             parser.error("--backend=local-files requires --local-file-root be set")
         logger.info("root of file backend: %s", args.local_file_root)
 
-        backend = FileBackend(args.local_file_root)
+        from alertdb.storage import FileBackend
+
+        backend: AlertDatabaseBackend = FileBackend(args.local_file_root)
 
     elif args.backend == "google-cloud":
         logger.info("using google-cloud backend")
@@ -99,26 +258,65 @@ def main():
         logger.info("gcp_bucket_alerts: %s", args.gcp_bucket_alerts)
         logger.info("gcp_bucket_schemas: %s", args.gcp_bucket_schemas)
 
+        from alertdb.storage import GoogleObjectStorageBackend
+
+        if args.gcp_parallel_chunk_bytes < 0:
+            parser.error("--gcp-parallel-chunk-bytes must not be negative")
         backend = GoogleObjectStorageBackend(
-            args.gcp_project, args.gcp_bucket_alerts, args.gcp_bucket_schemas
+            args.gcp_project,
+            args.gcp_bucket_alerts,
+            args.gcp_bucket_schemas,
+            # Every I/O thread may be using a connection at once.
+            max_pool_connections=args.io_threads,
+            parallel_chunk_size=args.gcp_parallel_chunk_bytes or None,
         )
 
+    elif args.backend == "s3":
+        logger.info("using s3 backend")
+        logger.info("s3_endpoint_url: %s", args.s3_endpoint_url)
+        logger.info("s3_bucket_alerts: %s", args.s3_bucket_alerts)
+        logger.info("s3_bucket_schemas: %s", args.s3_bucket_schemas)
+
+        from alertdb.storage import S3ObjectStorageBackend
+
+        try:
+            backend = S3ObjectStorageBackend(
+                args.s3_bucket_alerts,
+                args.s3_bucket_schemas,
+                endpoint_url=args.s3_endpoint_url,
+                max_pool_connections=args.io_threads,
+            )
+        except ImportError:
+            parser.error(
+                "--backend=s3 requires boto3; install with 'pip install .[s3]'"
+            )
+
     else:
         # Shouldn't be possible if argparse is using the choices parameter as
         # expected...
         raise AssertionError(
-            "only valid --backend choices are local-files and google-cloud"
+            "only valid --backend choices are local-files, google-cloud and s3"
         )
 
-    logger.info("backend initialized, creating server")
-    server = create_server(backend)
+    prefetch_alert_ids = []
+    if args.prefetch_ids_file is not None:
+        try:
+            with open(args.prefetch_ids_file) as f:
+                prefetch_alert_ids = [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            parser.error(f"unable to read --prefetch-ids-file: {e}")
+        for alert_id in prefetch_alert_ids:
+            if not valid_id(alert_id):
+                parser.error(f"invalid alert ID in --prefetch-ids-file: {alert_id!r}")
+        logger.info("prefetching %d alerts", len(prefetch_alert_ids))
 
-    logger.info(
-        "server initialized, running at %s:%s", args.listen_host, args.listen_port
-    )
-    uvicorn.run(
-        server,
-        host=args.listen_host,
-        port=args.listen_port,
-        log_level=uvicorn_log_level,
+    logger.info("backend initialized, creating server")
+    return create_server(
+        backend,
+        alert_cache_bytes=args.alert_cache_bytes,
+        schema_cache_ttl=args.schema_cache_ttl,
+        io_threads=args.io_threads,
+        prefetch_stride=args.prefetch_stride,
+        missing_alert_ttl=args.missing_alert_ttl,
+        prefetch_alert_ids=prefetch_alert_ids,
     )
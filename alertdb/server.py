@@ -1,8 +1,30 @@
 """HTTP frontend server implementation."""
 
-from fastapi import FastAPI, HTTPException, Response
+import asyncio
+import concurrent.futures
+import logging
+import os
+import secrets
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
-from alertdb.storage import AlertDatabaseBackend, NotFoundError
+import cachetools
+from fastapi import Body, FastAPI, Header, HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from alertdb.storage import AlertDatabaseBackend, FileBackend, NotFoundError, valid_id
+
+logger = logging.getLogger(__name__)
 
 # This Content-Type is described as the "preferred content type" for a
 # Confluent Schema Registry here:
@@ -12,16 +34,82 @@ from alertdb.storage import AlertDatabaseBackend, NotFoundError
 
 SCHEMA_CONTENT_TYPE = "application/vnd.schemaregistry.v1+json"
 
-# There's no consensus on an Avro content type. application/avro+binary is
-# sometimes used, but not very standard. If we did that, we'd want to specify
-# the content-encoding as well, since contents are gzipped.
+# There's no consensus on an Avro content type; avro/binary is what the Avro
+# specification itself uses for its RPC protocol, so it's used here.
 #
-# application/octet-stream, which represents arbitrary bytes, is maybe overly
-# general, but it's at least well-understood.
-ALERT_CONTENT_TYPE = "application/octet-stream"
+# Alerts are stored gzipped, so they're served with a gzip Content-Encoding.
+# That way HTTP clients and intermediaries know the body is already
+# compressed. Clients which handle Accept-Encoding (most do) decompress it
+# transparently, so they receive plain Confluent Wire Format bytes. This is
+# also why the app must not use GZipMiddleware: it would compress the bodies
+# a second time.
+ALERT_CONTENT_TYPE = "avro/binary"
+
+# An alert never changes once it has been written, so clients and CDNs may keep
+# a copy indefinitely, and the alert ID alone is a valid ETag. Schemas are kept
+# for as long as the server caches them itself.
+ALERT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Alerts and schemas are immutable once written, so responses from the backend
+# can be held in memory and served again without another round trip. Alerts
+# vary a lot in size, so their cache is bounded by total bytes rather than by
+# entry count. Schemas are tiny and few, but could in principle be corrected
+# after publication, so they get a TTL.
+DEFAULT_ALERT_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_SCHEMA_CACHE_SIZE = 1024
+DEFAULT_SCHEMA_CACHE_TTL = 3600
+
+# Each lookup for an alert that doesn't exist costs a backend round trip, and a
+# misbehaving client can make a lot of them. Recently missing IDs are
+# remembered for a short while and answered with a 404 immediately. The TTL
+# bounds how long a newly written alert can keep looking missing. The 404 is
+# marked cacheable for as long, so that CDNs and proxies don't pass repeated
+# lookups on either. Missing schemas are treated the same way.
+MISSING_ALERT_CACHE_SIZE = 8192
+DEFAULT_MISSING_ALERT_TTL = 60
+
+# Alerts from a FileBackend are sent straight from disk, but the lookup of the
+# file is remembered so that a popular alert doesn't cost a stat on every
+# request. Entries are small, so this is bounded by count.
+ALERT_FILE_CACHE_SIZE = 65536
+
+# Starlette's FileResponse sends a file in 4 KiB pieces, each read on a worker
+# thread, so a large alert took hundreds of thread round trips. Alerts are
+# read in pieces of this size instead, the same as the GCS backend streams.
+ALERT_FILE_CHUNK_SIZE = 1024 * 1024
+
+# Streamed alerts are collected for the cache as they are sent, but only up to
+# this size; holding larger ones would defeat the point of streaming them.
+MAX_STREAMED_ALERT_CACHE_BYTES = 4 * 1024 * 1024
+
+# Backend calls block on network or disk I/O, so they run on a dedicated thread
+# pool rather than the small default one shared with the rest of the app. This
+# matches the GCS backend's default connection pool size.
+DEFAULT_IO_THREADS = 64
+
+# Consumers often page through alerts in ID order. When prefetching is enabled,
+# a request which misses the cache queues up the alerts with the next few IDs
+# to be fetched in the background. The queue is bounded so that a burst of
+# misses can't build up unbounded background work; extra requests to prefetch
+# are dropped.
+PREFETCH_QUEUE_SIZE = 64
+
+# The largest number of alerts which can be requested in one batch.
+MAX_BATCH_SIZE = 1000
+
+T = TypeVar("T")
 
 
-def create_server(backend: AlertDatabaseBackend) -> FastAPI:
+def create_server(
+    backend: AlertDatabaseBackend,
+    alert_cache_bytes: int = DEFAULT_ALERT_CACHE_BYTES,
+    schema_cache_size: int = DEFAULT_SCHEMA_CACHE_SIZE,
+    schema_cache_ttl: float = DEFAULT_SCHEMA_CACHE_TTL,
+    io_threads: int = DEFAULT_IO_THREADS,
+    prefetch_stride: int = 0,
+    missing_alert_ttl: float = DEFAULT_MISSING_ALERT_TTL,
+    prefetch_alert_ids: Sequence[str] = (),
+) -> FastAPI:
     """
     Creates a new instance of an HTTP handler which fetches alerts and schemas
     from a backend.
@@ -30,6 +118,30 @@ def create_server(backend: AlertDatabaseBackend) -> FastAPI:
     ----------
     backend : AlertDatabaseBackend
         The backend that stores alerts to be served.
+    alert_cache_bytes : int
+        The maximum total size, in bytes, of alert payloads held in the
+        in-memory LRU cache. Set to 0 to disable alert caching.
+    schema_cache_size : int
+        The maximum number of schemas held in the in-memory cache.
+    schema_cache_ttl : float
+        The number of seconds a cached schema is served before it is fetched
+        from the backend again.
+    io_threads : int
+        The number of threads used to make blocking calls to the backend. This
+        bounds the number of backend requests in flight at once.
+    prefetch_stride : int
+        When an alert with an integer ID has to be fetched from the backend,
+        also fetch this many alerts with the following IDs into the cache in
+        the background. 0 disables prefetching. This has no effect for a
+        FileBackend, since its alerts aren't cached in memory.
+    missing_alert_ttl : float
+        The number of seconds to keep answering requests for an alert or
+        schema that the backend reported missing with a 404, without asking
+        the backend again. Clients may cache the 404 for as long.
+    prefetch_alert_ids : Sequence[str]
+        IDs of alerts to fetch into the cache in the background as soon as the
+        server starts, such as the alerts which are expected to be popular.
+        For a FileBackend, only the lookup of each alert's file is cached.
 
     Returns
     -------
@@ -44,26 +156,493 @@ def create_server(backend: AlertDatabaseBackend) -> FastAPI:
 
     app = FastAPI()
 
+    # The backend is fixed for the life of the server, so its methods are
+    # looked up once here instead of on every request.
+    get_backend_alert = backend.get_alert
+    get_backend_alerts = backend.get_alerts
+    open_backend_alert = backend.open_alert
+    get_backend_schema = backend.get_schema
+    list_backend_schemas = backend.list_schemas
+    get_alert_file = (
+        backend.get_alert_file if isinstance(backend, FileBackend) else None
+    )
+
+    # Handlers are coroutines, so that a cache hit is answered directly on the
+    # event loop. Only a cache miss goes through the I/O thread pool, where the
+    # blocking backend call is made. All cache access happens on the event
+    # loop, so no locking is needed. A failed lookup is remembered only
+    # briefly, in missing_alerts or missing_schemas.
+    alert_cache: "cachetools.LRUCache[str, bytes]" = cachetools.LRUCache(
+        maxsize=alert_cache_bytes, getsizeof=len
+    )
+    schema_cache: "cachetools.TTLCache[str, bytes]" = cachetools.TTLCache(
+        maxsize=schema_cache_size, ttl=schema_cache_ttl
+    )
+    missing_alerts: "cachetools.TTLCache[str, bool]" = cachetools.TTLCache(
+        maxsize=MISSING_ALERT_CACHE_SIZE, ttl=missing_alert_ttl
+    )
+    missing_schemas: "cachetools.TTLCache[str, bool]" = cachetools.TTLCache(
+        maxsize=MISSING_ALERT_CACHE_SIZE, ttl=missing_alert_ttl
+    )
+    not_found_headers = {"Cache-Control": f"public, max-age={int(missing_alert_ttl)}"}
+    alert_files: "cachetools.LRUCache[str, Tuple[str, os.stat_result]]" = (
+        cachetools.LRUCache(maxsize=ALERT_FILE_CACHE_SIZE)
+    )
+
+    app.state.executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=io_threads, thread_name_prefix="alertdb-io"
+    )
+
+    app.state.prefetch_queue = None
+
+    @app.on_event("startup")
+    async def start_prefetching():
+        if prefetch_stride > 0:
+            app.state.prefetch_queue = asyncio.Queue(maxsize=PREFETCH_QUEUE_SIZE)
+            app.state.prefetch_task = asyncio.create_task(prefetch_worker())
+
+    @app.on_event("startup")
+    async def preload_schemas():
+        # There's only a handful of schemas, so load them all up front and
+        # serve them from memory from the first request on. They're put in
+        # the ordinary schema cache, so they are still refreshed after the
+        # TTL.
+        try:
+            schema_ids = await run_io(list_backend_schemas)
+        except Exception:
+            # Not fatal: schemas are fetched on demand instead.
+            logger.exception("failed to list schemas to preload")
+            return
+        # One schema that can't be read only leaves that one to be fetched
+        # on demand; it doesn't stop the others being preloaded.
+        schemas = await asyncio.gather(
+            *(run_io(get_backend_schema, schema_id) for schema_id in schema_ids),
+            return_exceptions=True,
+        )
+        preloaded = 0
+        for schema_id, schema_bytes in zip(schema_ids, schemas):
+            if isinstance(schema_bytes, BaseException):
+                logger.warning(
+                    "failed to preload schema id=%s: %r", schema_id, schema_bytes
+                )
+                continue
+            _cache_insert(schema_cache, schema_id, schema_bytes)
+            preloaded += 1
+        logger.info("preloaded %d schemas", preloaded)
+
+    app.state.warmup_task = None
+
+    @app.on_event("startup")
+    async def start_warming_alerts():
+        # Unlike schemas, there may be a lot of these, so the server doesn't
+        # wait for them before it starts answering requests.
+        if prefetch_alert_ids:
+            app.state.warmup_task = asyncio.create_task(warm_alerts())
+
+    async def warm_alerts():
+        fetch = find_alert_file if get_alert_file is not None else fetch_alert
+        # The list may be long, and the server is already taking requests, so
+        # only a fraction of the I/O pool is spent on it at a time.
+        slots = asyncio.Semaphore(max(1, io_threads // 4))
+
+        async def warm(alert_id: str):
+            async with slots:
+                await prefetch(fetch, alert_id)
+
+        await asyncio.gather(*(warm(alert_id) for alert_id in prefetch_alert_ids))
+        logger.info("prefetched %d alerts", len(prefetch_alert_ids))
+
+    @app.on_event("shutdown")
+    def shutdown():
+        if app.state.prefetch_queue is not None:
+            app.state.prefetch_task.cancel()
+        if app.state.warmup_task is not None:
+            app.state.warmup_task.cancel()
+        app.state.executor.shutdown(wait=False)
+        backend.close()
+
+    async def run_io(func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(app.state.executor, func, *args)
+
+    def schedule_prefetch(alert_id: str):
+        # Only plain ASCII decimal IDs have neighbours: isdigit alone would
+        # let through things like "²" or "١٢", which int() rejects or reads
+        # differently from how they're stored.
+        is_decimal = alert_id.isascii() and alert_id.isdecimal()
+        if app.state.prefetch_queue is None or not is_decimal:
+            return
+        try:
+            app.state.prefetch_queue.put_nowait(alert_id)
+        except asyncio.QueueFull:
+            pass
+
+    async def prefetch_worker():
+        while True:
+            alert_id = await app.state.prefetch_queue.get()
+            try:
+                neighbors = [
+                    neighbor
+                    for neighbor in _following_ids(alert_id, prefetch_stride)
+                    if neighbor not in alert_cache
+                ]
+                await asyncio.gather(
+                    *(prefetch(fetch_alert, neighbor) for neighbor in neighbors)
+                )
+            except Exception:
+                # Nothing restarts the worker, so it must outlive anything
+                # that goes wrong with one alert.
+                logger.exception("failed to prefetch after alert id=%s", alert_id)
+            finally:
+                app.state.prefetch_queue.task_done()
+
+    async def prefetch(fetch: Callable[..., Awaitable[Any]], alert_id: str):
+        try:
+            await fetch(alert_id, record_missing=False)
+        except NotFoundError:
+            pass
+        except Exception:
+            # A failed prefetch mustn't stop the worker; the alert will just
+            # be fetched again if it's requested.
+            logger.exception("failed to prefetch alert id=%s", alert_id)
+
     @app.get("/v1/health")
-    def healthcheck():
+    async def healthcheck():
         return Response(content=b"OK")
 
-    @app.get("/v1/schemas/{schema_id}")
-    def get_schema(schema_id: str):
+    schema_cache_control = f"public, max-age={int(schema_cache_ttl)}"
+
+    # Schemas are stored as JSON and sent exactly as stored. They must never be
+    # parsed or returned as Python objects, which would send them through
+    # FastAPI's JSONResponse to be re-encoded on every request; the explicit
+    # response_class keeps the route's documented type honest too.
+    @app.get("/v1/schemas/{schema_id}", response_class=Response)
+    async def get_schema(schema_id: str, if_none_match: Optional[str] = Header(None)):
+        _check_id(schema_id)
+        schema_bytes = schema_cache.get(schema_id)
+        # A schema known to be missing is reported as such before any
+        # conditional header is looked at, so it's never "not modified".
+        if schema_bytes is None and schema_id in missing_schemas:
+            raise HTTPException(
+                status_code=404, detail="schema not found", headers=not_found_headers
+            )
+        headers = {"ETag": _etag(schema_id), "Cache-Control": schema_cache_control}
+        if _etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        if schema_bytes is None:
+            try:
+                schema_bytes = await run_io(get_backend_schema, schema_id)
+            except NotFoundError as nfe:
+                missing_schemas[schema_id] = True
+                raise HTTPException(
+                    status_code=404,
+                    detail="schema not found",
+                    headers=not_found_headers,
+                ) from nfe
+            _cache_insert(schema_cache, schema_id, schema_bytes)
+
+        # "*" matches any schema that exists, so it can only be answered now.
+        if _matches_any(if_none_match):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=schema_bytes, media_type=SCHEMA_CONTENT_TYPE, headers=headers
+        )
+
+    async def call_backend(
+        func: Callable[[str], T], alert_id: str, record_missing: bool = True
+    ) -> T:
+        """
+        Call one of the backend's alert methods on the I/O pool, unless the
+        alert is already known to be missing.
+
+        A miss is only remembered if record_missing is set. Prefetches leave
+        it unset: they guess at IDs, often ones that are about to be written,
+        and a wrong guess mustn't become a cached 404 for the first client to
+        ask for the alert once it exists.
+        """
+        if alert_id in missing_alerts:
+            raise NotFoundError("alert not found")
         try:
-            schema_bytes = backend.get_schema(schema_id)
-        except NotFoundError as nfe:
-            raise HTTPException(status_code=404, detail="schema not found") from nfe
+            return await run_io(func, alert_id)
+        except NotFoundError:
+            if record_missing:
+                missing_alerts[alert_id] = True
+            raise
+
+    async def find_alert_file(
+        alert_id: str, record_missing: bool = True
+    ) -> Tuple[str, os.stat_result]:
+        assert get_alert_file is not None
+        alert_file = alert_files.get(alert_id)
+        if alert_file is None:
+            alert_file = await call_backend(get_alert_file, alert_id, record_missing)
+            alert_files[alert_id] = alert_file
+        return alert_file
 
-        return Response(content=schema_bytes, media_type=SCHEMA_CONTENT_TYPE)
+    async def fetch_alert(alert_id: str, record_missing: bool = True) -> bytes:
+        alert_bytes = alert_cache.get(alert_id)
+        if alert_bytes is None:
+            alert_bytes = await call_backend(
+                get_backend_alert, alert_id, record_missing
+            )
+            _cache_insert(alert_cache, alert_id, alert_bytes)
+        return alert_bytes
 
     @app.get("/v1/alerts/{alert_id}")
-    def get_alert(alert_id: str):
+    async def get_alert(alert_id: str, if_none_match: Optional[str] = Header(None)):
+        _check_id(alert_id)
+        # Answer a known-missing alert straight away, rather than by way of a
+        # NotFoundError from call_backend; clients probing for IDs can send a
+        # lot of these. This comes before any conditional header is looked
+        # at, so a missing alert is never "not modified".
+        if alert_id in missing_alerts:
+            raise HTTPException(
+                status_code=404, detail="alert not found", headers=not_found_headers
+            )
+
+        not_modified_headers = {
+            "ETag": _etag(alert_id),
+            "Cache-Control": ALERT_CACHE_CONTROL,
+        }
+        if _etag_matches(if_none_match, not_modified_headers["ETag"]):
+            return Response(status_code=304, headers=not_modified_headers)
+        # "*" matches any alert that exists, so it can only be answered once
+        # the alert has been found.
+        matches_any = _matches_any(if_none_match)
+        headers = {**not_modified_headers, "Content-Encoding": "gzip"}
+
+        if get_alert_file is not None:
+            # Files on local disk are sent straight from the OS page cache
+            # rather than being read into (and cached in) Python memory. The
+            # file's status is handed over too, so that it isn't checked again.
+            try:
+                path, stat_result = await find_alert_file(alert_id)
+            except NotFoundError as nfe:
+                raise HTTPException(
+                    status_code=404, detail="alert not found", headers=not_found_headers
+                ) from nfe
+            if matches_any:
+                return Response(status_code=304, headers=not_modified_headers)
+            return _AlertFileResponse(
+                path,
+                media_type=ALERT_CONTENT_TYPE,
+                headers=headers,
+                stat_result=stat_result,
+            )
+
+        alert_bytes = alert_cache.get(alert_id)
+        if alert_bytes is not None:
+            if matches_any:
+                return Response(status_code=304, headers=not_modified_headers)
+            return _CachedAlertResponse(alert_id, alert_bytes)
+
+        # On a miss, stream the alert from the backend instead of buffering it
+        # all first. The backend raises NotFoundError when the stream is
+        # opened, so a missing alert is still a 404 rather than a cut-off 200.
         try:
-            alert_bytes = backend.get_alert(alert_id)
+            chunks = await call_backend(open_backend_alert, alert_id)
         except NotFoundError as nfe:
-            raise HTTPException(status_code=404, detail="alert not found") from nfe
+            raise HTTPException(
+                status_code=404, detail="alert not found", headers=not_found_headers
+            ) from nfe
+        if matches_any:
+            _close_chunks(chunks)
+            return Response(status_code=304, headers=not_modified_headers)
+        schedule_prefetch(alert_id)
+
+        return StreamingResponse(
+            stream_alert(alert_id, chunks),
+            media_type=ALERT_CONTENT_TYPE,
+            headers=headers,
+        )
+
+    async def stream_alert(
+        alert_id: str, chunks: Iterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        """
+        Relay an alert's chunks from the backend, caching the alert once it has
+        been sent if it is small enough.
+        """
+        received: Optional[List[bytes]] = []
+        size = 0
+        try:
+            while True:
+                chunk = await run_io(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+                size += len(chunk)
+                if received is not None:
+                    received.append(chunk)
+                    if size > MAX_STREAMED_ALERT_CACHE_BYTES:
+                        received = None
+        finally:
+            _close_chunks(chunks)
+        if received is not None:
+            _cache_insert(alert_cache, alert_id, b"".join(received))
+
+    @app.post("/v1/alerts:batchGet")
+    async def batch_get_alerts(alert_ids: List[str] = Body(...)):
+        """
+        Retrieve many alerts in one request.
 
-        return Response(content=alert_bytes, media_type=ALERT_CONTENT_TYPE)
+        The request body is a JSON list of alert IDs. The response is a
+        multipart/mixed document with one part per alert that was found, in
+        request order; each part's Content-ID header holds the alert ID.
+        Alerts that don't exist are left out of the response.
+        """
+        if len(alert_ids) > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"at most {MAX_BATCH_SIZE} alerts can be requested at once",
+            )
+        for alert_id in alert_ids:
+            _check_id(alert_id)
+
+        unique_ids = list(dict.fromkeys(alert_ids))
+        payloads = {}
+        to_fetch = []
+        for alert_id in unique_ids:
+            alert_bytes = alert_cache.get(alert_id)
+            if alert_bytes is not None:
+                payloads[alert_id] = alert_bytes
+            elif alert_id not in missing_alerts:
+                to_fetch.append(alert_id)
+
+        # Everything that isn't already known is requested from the backend in
+        # one call, which can fetch them however suits it best.
+        if to_fetch:
+            fetched = await run_io(get_backend_alerts, to_fetch)
+            for alert_id in to_fetch:
+                alert_bytes = fetched.get(alert_id)
+                if alert_bytes is None:
+                    missing_alerts[alert_id] = True
+                else:
+                    _cache_insert(alert_cache, alert_id, alert_bytes)
+                    payloads[alert_id] = alert_bytes
+
+        found = [(i, payloads[i]) for i in unique_ids if i in payloads]
+
+        boundary = secrets.token_hex(16)
+        return StreamingResponse(
+            _multipart_body(boundary, found),
+            media_type=f"multipart/mixed; boundary={boundary}",
+        )
 
     return app
+
+
+# A cached alert is answered with the same headers as any other, apart from its
+# ETag and length, so the rest are encoded once here instead of on every hit.
+_ALERT_RAW_HEADERS = [
+    (b"cache-control", ALERT_CACHE_CONTROL.encode("latin-1")),
+    (b"content-encoding", b"gzip"),
+    (b"content-type", ALERT_CONTENT_TYPE.encode("latin-1")),
+]
+
+
+class _CachedAlertResponse(Response):
+    """
+    A response for an alert held in memory, with its headers put together
+    directly rather than through Response's general-purpose encoding.
+
+    Response.__init__ still runs, with no content, so that anything else it
+    sets up is there; only the body and headers are then replaced.
+    """
+
+    def __init__(self, alert_id: str, alert_bytes: bytes):
+        super().__init__(status_code=200)
+        self.body = alert_bytes
+        self.raw_headers = [
+            (b"etag", _etag(alert_id).encode("latin-1")),
+            (b"content-length", str(len(alert_bytes)).encode("latin-1")),
+            *_ALERT_RAW_HEADERS,
+        ]
+
+
+class _AlertFileResponse(FileResponse):
+    chunk_size = ALERT_FILE_CHUNK_SIZE
+
+
+def _check_id(object_id: str):
+    """
+    Reject a request for an invalid alert or schema ID with a 400 response.
+    """
+    if not valid_id(object_id):
+        raise HTTPException(status_code=400, detail=f"invalid ID: {object_id!r}")
+
+
+def _following_ids(alert_id: str, count: int) -> List[str]:
+    """
+    List the count integer IDs after alert_id, keeping any zero padding.
+    """
+    start = int(alert_id)
+    return [str(start + i).zfill(len(alert_id)) for i in range(1, count + 1)]
+
+
+def _etag(object_id: str) -> str:
+    return f'"{object_id}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Report whether an If-None-Match request header matches an ETag.
+
+    The header holds a comma-separated list of ETags, or "*". Comparison is
+    weak, as RFC 7232 requires for If-None-Match. "*" isn't handled here,
+    since it depends on whether the object exists; see _matches_any.
+    """
+    if if_none_match is None:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _matches_any(if_none_match: Optional[str]) -> bool:
+    """
+    Report whether an If-None-Match request header is "*", which matches any
+    object that exists.
+    """
+    return if_none_match is not None and if_none_match.strip() == "*"
+
+
+def _close_chunks(chunks: Iterator[bytes]):
+    """
+    Close a stream of chunks from a backend's open_alert, if it can be closed.
+    """
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
+
+
+def _multipart_body(boundary: str, alerts: List[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """
+    Generate a multipart/mixed body (RFC 2046) with one part per alert.
+    """
+    delimiter = b"--" + boundary.encode("ascii")
+    for alert_id, payload in alerts:
+        yield delimiter + b"\r\n"
+        yield f"Content-Type: {ALERT_CONTENT_TYPE}\r\n".encode("ascii")
+        yield b"Content-Encoding: gzip\r\n"
+        yield f"Content-ID: <{alert_id}>\r\n\r\n".encode("utf-8")
+        yield payload
+        yield b"\r\n"
+    yield delimiter + b"--\r\n"
+
+
+def _cache_insert(cache: cachetools.Cache, key: str, value: bytes):
+    """
+    Store a value in a cache, unless it is too large to ever fit.
+    """
+    try:
+        cache[key] = value
+    except ValueError:
+        # cachetools raises ValueError for a value bigger than the cache's
+        # maxsize. That's not an error for us; the value just isn't cached.
+        pass
@@ -3,11 +3,12 @@ Implementations of backend storage systems for the alert database server.
 """
 
 import abc
+import concurrent.futures
+import functools
 import logging
-import os.path
-
-import google.api_core.exceptions
-import google.cloud.storage as gcs
+import os
+import stat
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +64,63 @@ class AlertDatabaseBackend(abc.ABC):
         """
         raise NotImplementedError()
 
+    def open_alert(self, alert_id: str) -> Iterator[bytes]:
+        """
+        Retrieve a single alert's payload as a stream of chunks, so that it
+        doesn't need to be held in memory all at once.
+
+        The chunks join up to exactly what get_alert returns. The default
+        implementation just yields the result of get_alert in one chunk;
+        backends that can stream should override it.
+
+        Parameters
+        ----------
+        alert_id : str
+            The ID of the alert to be retrieved.
+
+        Returns
+        -------
+        Iterator[bytes]
+            The alert contents in compressed Confluent Wire Format, in chunks.
+            If the iterator has a close method, callers should call it if they
+            stop reading early.
+
+        Raises
+        ------
+        NotFoundError
+            If no alert can be found with that ID. This is raised by
+            open_alert itself, not while iterating over the chunks.
+        """
+        return iter([self.get_alert(alert_id)])
+
+    def get_alerts(self, alert_ids: List[str]) -> Dict[str, bytes]:
+        """
+        Retrieve many alerts' payloads at once.
+
+        The server uses this to answer batch requests with a single call. The
+        default implementation calls get_alert for each ID in turn, which is
+        fine for local storage; backends with a per-request round trip should
+        override it to fetch concurrently.
+
+        Parameters
+        ----------
+        alert_ids : List[str]
+            The IDs of the alerts to be retrieved.
+
+        Returns
+        -------
+        Dict[str, bytes]
+            The contents of each alert that was found, keyed by ID, in the same
+            form as get_alert returns. Alerts that can't be found are left out.
+        """
+        alerts = {}
+        for alert_id in alert_ids:
+            try:
+                alerts[alert_id] = self.get_alert(alert_id)
+            except NotFoundError:
+                pass
+        return alerts
+
     @abc.abstractmethod
     def get_schema(self, schema_id: str) -> bytes:
         """
@@ -104,6 +162,30 @@ class AlertDatabaseBackend(abc.ABC):
         """
         raise NotImplementedError()
 
+    def list_schemas(self) -> List[str]:
+        """
+        List the IDs of all the schemas in the backend.
+
+        There are only a few schemas - one per version of the alert format -
+        so the server uses this to load them all when it starts. The default
+        implementation returns an empty list, for backends which can't
+        enumerate their schemas; they are then fetched as they are requested.
+
+        Returns
+        -------
+        List[str]
+            The IDs of the schemas, in no particular order.
+        """
+        return []
+
+    def close(self):
+        """
+        Release anything the backend holds, like thread pools.
+
+        The server calls this when it shuts down. The default implementation
+        does nothing.
+        """
+
 
 class FileBackend(AlertDatabaseBackend):
     """
@@ -111,60 +193,582 @@ class FileBackend(AlertDatabaseBackend):
 
     This is provided as an example, to ensure that it's clear how to implement
     an AlertDatabaseBackend subclass.
+
+    Parameters
+    ----------
+    root_dir : str
+        The directory holding the "alerts" and "schemas" directories.
+    stream_chunk_size : int
+        The size of the chunks that open_alert reads.
     """
 
-    def __init__(self, root_dir: str):
+    def __init__(self, root_dir: str, stream_chunk_size: int = 1024 * 1024):
         self.root_dir = root_dir
+        self.stream_chunk_size = stream_chunk_size
+        self._alert_dir = os.path.normpath(os.path.join(root_dir, "alerts"))
+        self._schema_dir = os.path.normpath(os.path.join(root_dir, "schemas"))
+
+    def get_alert_file(self, alert_id: str) -> Tuple[str, os.stat_result]:
+        """
+        Get the path of the file holding an alert's payload, so that it can be
+        sent without being read into memory first, along with the file's
+        status. Alerts are immutable, so callers may hold on to both.
+
+        Raises
+        ------
+        NotFoundError
+            If no alert can be found with that ID.
+        """
+        path = self._alert_path(alert_id)
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError as file_not_found:
+            raise NotFoundError("alert not found") from file_not_found
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise NotFoundError("alert not found")
+        return path, stat_result
 
     def get_alert(self, alert_id: str) -> bytes:
+        path = self._alert_path(alert_id)
         try:
-            with open(os.path.join(self.root_dir, "alerts", alert_id), "rb") as f:
-                return f.read()
+            return _read_file(path)
         except FileNotFoundError as file_not_found:
             raise NotFoundError("alert not found") from file_not_found
 
+    def open_alert(self, alert_id: str) -> Iterator[bytes]:
+        # The server sends local files with get_alert_file instead, but this
+        # keeps the backend usable as a stream by anything else. The file is
+        # opened straight away, so that a missing alert is reported here.
+        try:
+            f = open(self._alert_path(alert_id), "rb", buffering=0)
+        except FileNotFoundError as file_not_found:
+            raise NotFoundError("alert not found") from file_not_found
+        return self._read_chunks(f)
+
+    def _read_chunks(self, f) -> Iterator[bytes]:
+        with f:
+            while True:
+                chunk = f.read(self.stream_chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
     def get_schema(self, schema_id: str) -> bytes:
+        path = self._schema_path(schema_id)
         try:
-            with open(os.path.join(self.root_dir, "schemas", schema_id), "rb") as f:
-                return f.read()
+            return _read_file(path)
         except FileNotFoundError as file_not_found:
             raise NotFoundError("schema not found") from file_not_found
 
+    def _alert_path(self, alert_id: str) -> str:
+        path = _child_path(self._alert_dir, alert_id)
+        if path is None:
+            raise NotFoundError("alert not found")
+        return path
+
+    def _schema_path(self, schema_id: str) -> str:
+        path = _child_path(self._schema_dir, schema_id)
+        if path is None:
+            raise NotFoundError("schema not found")
+        return path
+
+    def list_schemas(self) -> List[str]:
+        # Anything else in the directory, like a subdirectory or a stray
+        # dotfile, isn't a schema that could be requested.
+        try:
+            with os.scandir(self._schema_dir) as entries:
+                return [
+                    entry.name
+                    for entry in entries
+                    if entry.is_file() and valid_id(entry.name)
+                ]
+        except FileNotFoundError:
+            return []
+
+
+_INVALID_ID_CHARACTERS = frozenset('/\\", ')
+
+
+def valid_id(object_id: str) -> bool:
+    """
+    Report whether a string is acceptable as an alert or schema ID.
+
+    IDs are used to build file paths and object names, so they mustn't be
+    able to lead out of the directory or prefix they belong in. They are also
+    written into ETag and multipart headers, so they must be printable ASCII:
+    no control characters like CR and LF, and nothing that can't be encoded
+    in a header. The ETag is the quoted ID, so quotes, commas and spaces,
+    which would break it or its parsing from If-None-Match, aren't allowed
+    either.
+    """
+    if not object_id or object_id.startswith("."):
+        return False
+    if not (object_id.isascii() and object_id.isprintable()):
+        return False
+    return _INVALID_ID_CHARACTERS.isdisjoint(object_id)
+
+
+def _child_path(directory: str, name: str) -> Optional[str]:
+    """
+    Get the path of the entry called name in directory, or None if the name
+    would lead anywhere else, like "../secret" or "/etc/passwd" would.
+
+    The directory must already be normalized.
+    """
+    if "\0" in name:
+        return None
+    path = os.path.normpath(os.path.join(directory, name))
+    if os.path.dirname(path) != directory:
+        return None
+    return path
+
+
+def _read_file(path: str) -> bytes:
+    """
+    Read a whole file, normally in a single read syscall.
+
+    Files are read whole, so there's no use for the io module's buffering.
+    The file's size is known up front, so the read is sized to it, instead of
+    being done in pieces until a read comes back empty.
+
+    os.read fills the bytes object it returns directly, so this is already a
+    single copy out of the page cache. Reading into a bytearray instead would
+    not save anything: the server needs bytes, to cache and to hand to
+    Starlette, so the buffer would only have to be copied again.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        if len(data) < size:
+            # A short read is unusual for a regular file, but allowed.
+            chunks = [data]
+            while True:
+                chunk = os.read(fd, size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            data = b"".join(chunks)
+        return data
+    finally:
+        os.close(fd)
+
 
 class GoogleObjectStorageBackend(AlertDatabaseBackend):
     """
     Retrieves alerts and schemas from a Google Cloud Storage bucket.
 
     The path for alert and schema objects follows the scheme in DMTN-183.
+
+    Parameters
+    ----------
+    gcp_project : str
+        The name of the Google Cloud project that owns the buckets.
+    packet_bucket_name : str
+        The name of the bucket that holds alert packets.
+    schema_bucket_name : str
+        The name of the bucket that holds alert schemas.
+    max_pool_connections : int
+        The number of keep-alive HTTPS connections to Google Cloud Storage to
+        hold open. This should be at least the number of requests served
+        concurrently, or connections get discarded and re-established under
+        load.
+    stream_chunk_size : int
+        The size of the chunks that open_alert downloads. Each chunk is a
+        separate ranged request, so alerts smaller than this are fetched in a
+        single request.
+    parallel_chunk_size : int or None
+        If set, get_alert downloads alerts larger than this as several ranges
+        of this size at once, over parallel connections, which is faster for
+        large objects than one stream. Alerts no larger than this are still
+        fetched in a single request, but without a checksum, since GCS can't
+        provide one for a range. This has no effect on open_alert, which
+        streams one range at a time. None, the default, disables this.
+    parallel_download_threads : int
+        The number of ranges of one alert to download at once, when
+        parallel_chunk_size is set.
     """
 
+    # Object names are built on every request, so the fixed parts of the
+    # DMTN-183 layout are kept as constants and concatenated, rather than run
+    # through an f-string each time.
+    _alert_prefix = "alert_archive/v1/alerts/"
+    _alert_suffix = ".avro.gz"
+    _schema_prefix = "alert_archive/v1/schemas/"
+    _schema_suffix = ".json"
+
     def __init__(
-        self, gcp_project: str, packet_bucket_name: str, schema_bucket_name: str
+        self,
+        gcp_project: str,
+        packet_bucket_name: str,
+        schema_bucket_name: str,
+        max_pool_connections: int = 64,
+        stream_chunk_size: int = 1024 * 1024,
+        parallel_chunk_size: Optional[int] = None,
+        parallel_download_threads: int = 8,
     ):
-        self.object_store_client = gcs.Client(project=gcp_project)
+        # The Google Cloud libraries are slow to import and heavy in memory, so
+        # they're only loaded when this backend is actually used.
+        import google.api_core.exceptions
+
+        self._not_found_error = google.api_core.exceptions.NotFound
+        self._range_not_satisfiable_error = (
+            google.api_core.exceptions.RequestRangeNotSatisfiable
+        )
+        self.object_store_client = _google_storage_client(
+            gcp_project, max_pool_connections
+        )
         self.packet_bucket = self.object_store_client.bucket(packet_bucket_name)
         self.schema_bucket = self.object_store_client.bucket(schema_bucket_name)
+        self.stream_chunk_size = stream_chunk_size
+        self._batch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_pool_connections, thread_name_prefix="alertdb-gcs-batch"
+        )
+        self.parallel_chunk_size = parallel_chunk_size
+        self._download_pool = None
+        if parallel_chunk_size is not None:
+            # get_alert is itself called from the server's thread pool, so
+            # ranges are fetched on a separate pool; waiting on the same one
+            # could deadlock.
+            self._download_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=parallel_download_threads,
+                thread_name_prefix="alertdb-gcs-range",
+            )
 
     def get_alert(self, alert_id: str) -> bytes:
-        logger.info("retrieving alert id=%s", alert_id)
+        # This is called for every request that misses the server's cache, so
+        # skip even building the log call unless it will be emitted.
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("retrieving alert id=%s", alert_id)
         try:
             blob = self.packet_bucket.blob(
-                f"/alert_archive/v1/alerts/{alert_id}.avro.gz"
+                self._alert_prefix + alert_id + self._alert_suffix
             )
-            return blob.download_as_bytes()
-        except google.api_core.exceptions.NotFound as not_found:
+            if self.parallel_chunk_size is not None:
+                return self._download_in_parallel(blob)
+            # Alerts are served still gzipped, so ask for the stored bytes as
+            # they are. This skips any decompressive transcoding by GCS or
+            # requests, which would only be undone again on the way out.
+            return blob.download_as_bytes(raw_download=True)
+        except self._not_found_error as not_found:
+            raise NotFoundError("alert not found") from not_found
+
+    def get_alerts(self, alert_ids: List[str]) -> Dict[str, bytes]:
+        # Each alert is its own GET, so they're made concurrently, sharing the
+        # client's pool of connections.
+        return _get_alerts_concurrently(self._batch_pool, self.get_alert, alert_ids)
+
+    def _download_in_parallel(self, blob) -> bytes:
+        chunk_size = self.parallel_chunk_size
+        assert chunk_size is not None and self._download_pool is not None
+        # Most alerts fit in the first range, so it's fetched on its own
+        # before anything else: the object's size only needs to be looked up
+        # when there's more to come.
+        first = self._download_range(blob, 0, chunk_size, None)
+        if len(first) < chunk_size:
+            return first
+        # The download filled in the generation that the first range came
+        # from. Everything after it is pinned to that, so an alert rewritten
+        # partway through fails rather than splicing two versions together.
+        generation = blob.generation
+        blob.reload(if_generation_match=generation)
+        size = blob.size
+
+        def download_range(start: int) -> bytes:
+            return blob.download_as_bytes(
+                start=start,
+                end=min(start + chunk_size, size) - 1,
+                raw_download=True,
+                if_generation_match=generation,
+            )
+
+        rest = self._download_pool.map(
+            download_range, range(chunk_size, size, chunk_size)
+        )
+        return b"".join([first, *rest])
+
+    def open_alert(self, alert_id: str) -> Iterator[bytes]:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("streaming alert id=%s", alert_id)
+        blob = self.packet_bucket.blob(
+            self._alert_prefix + alert_id + self._alert_suffix
+        )
+        # Read the first chunk now, so that a missing alert is reported here
+        # rather than partway through iteration.
+        try:
+            first_chunk = self._download_range(blob, 0, self.stream_chunk_size, None)
+        except self._not_found_error as not_found:
             raise NotFoundError("alert not found") from not_found
+        return self._read_chunks(blob, first_chunk)
+
+    def _read_chunks(self, blob, chunk: bytes) -> Iterator[bytes]:
+        # The first download filled in the object's generation, and the rest
+        # are pinned to it, so that an alert rewritten partway through fails
+        # rather than splicing two versions together.
+        generation = blob.generation
+        start = 0
+        while chunk:
+            yield chunk
+            if len(chunk) < self.stream_chunk_size:
+                # A short read means the end of the object has been reached;
+                # don't spend a request to confirm it.
+                return
+            start += len(chunk)
+            chunk = self._download_range(
+                blob, start, self.stream_chunk_size, generation
+            )
+
+    def _download_range(
+        self, blob, start: int, length: int, generation: Optional[int]
+    ) -> bytes:
+        # This asks for the stored bytes as they are, so the ranges are
+        # ranges of the gzipped object that's served. BlobReader can't do
+        # that: it would decompress objects stored with Content-Encoding:
+        # gzip.
+        try:
+            return blob.download_as_bytes(
+                start=start,
+                end=start + length - 1,
+                raw_download=True,
+                if_generation_match=generation,
+            )
+        except self._range_not_satisfiable_error:
+            # The range starts at the end of the object: it was empty, or an
+            # exact multiple of the chunk size.
+            return b""
 
     def get_schema(self, schema_id: str) -> bytes:
-        logger.info("retrieving schema id=%s", schema_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("retrieving schema id=%s", schema_id)
         try:
             blob = self.schema_bucket.blob(
-                f"/alert_archive/v1/schemas/{schema_id}.json"
+                self._schema_prefix + schema_id + self._schema_suffix
             )
             return blob.download_as_bytes()
-        except google.api_core.exceptions.NotFound as not_found:
+        except self._not_found_error as not_found:
             raise NotFoundError("alert not found") from not_found
 
+    def list_schemas(self) -> List[str]:
+        blobs = self.object_store_client.list_blobs(
+            self.schema_bucket, prefix=self._schema_prefix
+        )
+        start, end = len(self._schema_prefix), -len(self._schema_suffix)
+        return [
+            blob.name[start:end]
+            for blob in blobs
+            if blob.name.endswith(self._schema_suffix)
+        ]
+
+    def close(self):
+        self._batch_pool.shutdown(wait=False)
+        if self._download_pool is not None:
+            self._download_pool.shutdown(wait=False)
+
+
+class S3ObjectStorageBackend(AlertDatabaseBackend):
+    """
+    Retrieves alerts and schemas from buckets in an S3-compatible object
+    store, using boto3.
+
+    By default this talks to Google Cloud Storage through its S3-compatible
+    XML API, which downloads a good deal faster than the JSON API used by
+    GoogleObjectStorageBackend. Objects follow the same DMTN-183 layout as
+    they do for that backend.
+
+    Credentials are found the usual way for boto3: for instance, through the
+    $AWS_ACCESS_KEY_ID and $AWS_SECRET_ACCESS_KEY environment variables. For
+    Google Cloud Storage, these are an HMAC key for a service account.
+
+    This needs boto3, which is installed with the package's ``s3`` extra.
+
+    Parameters
+    ----------
+    packet_bucket_name : str
+        The name of the bucket that holds alert packets.
+    schema_bucket_name : str
+        The name of the bucket that holds alert schemas.
+    endpoint_url : str
+        The URL of the object store's S3 API.
+    max_pool_connections : int
+        The number of keep-alive HTTPS connections to the object store to hold
+        open. As with GoogleObjectStorageBackend, this should be at least the
+        number of requests served concurrently.
+    stream_chunk_size : int
+        The size of the chunks that open_alert yields.
+    """
+
+    _alert_prefix = GoogleObjectStorageBackend._alert_prefix
+    _alert_suffix = GoogleObjectStorageBackend._alert_suffix
+    _schema_prefix = GoogleObjectStorageBackend._schema_prefix
+    _schema_suffix = GoogleObjectStorageBackend._schema_suffix
+
+    def __init__(
+        self,
+        packet_bucket_name: str,
+        schema_bucket_name: str,
+        endpoint_url: str = "https://storage.googleapis.com",
+        max_pool_connections: int = 64,
+        stream_chunk_size: int = 1024 * 1024,
+    ):
+        self.s3_client = _s3_client(endpoint_url, max_pool_connections)
+        self._not_found_error = self.s3_client.exceptions.NoSuchKey
+        self.packet_bucket_name = packet_bucket_name
+        self.schema_bucket_name = schema_bucket_name
+        self.stream_chunk_size = stream_chunk_size
+        self._batch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_pool_connections, thread_name_prefix="alertdb-s3-batch"
+        )
+
+    def get_alert(self, alert_id: str) -> bytes:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("retrieving alert id=%s", alert_id)
+        body = self._get_alert_body(alert_id)
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def open_alert(self, alert_id: str) -> Iterator[bytes]:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("streaming alert id=%s", alert_id)
+        # The object is requested now, so that a missing alert is reported
+        # here rather than partway through iteration.
+        return self._read_chunks(self._get_alert_body(alert_id))
+
+    def get_alerts(self, alert_ids: List[str]) -> Dict[str, bytes]:
+        return _get_alerts_concurrently(self._batch_pool, self.get_alert, alert_ids)
+
+    def _get_alert_body(self, alert_id: str):
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.packet_bucket_name,
+                Key=self._alert_prefix + alert_id + self._alert_suffix,
+            )
+        except self._not_found_error as not_found:
+            raise NotFoundError("alert not found") from not_found
+        return response["Body"]
+
+    def _read_chunks(self, body) -> Iterator[bytes]:
+        try:
+            yield from body.iter_chunks(self.stream_chunk_size)
+        finally:
+            body.close()
+
+    def get_schema(self, schema_id: str) -> bytes:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("retrieving schema id=%s", schema_id)
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.schema_bucket_name,
+                Key=self._schema_prefix + schema_id + self._schema_suffix,
+            )
+        except self._not_found_error as not_found:
+            raise NotFoundError("schema not found") from not_found
+        body = response["Body"]
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def list_schemas(self) -> List[str]:
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.schema_bucket_name, Prefix=self._schema_prefix
+        )
+        start, end = len(self._schema_prefix), -len(self._schema_suffix)
+        return [
+            obj["Key"][start:end]
+            for page in pages
+            for obj in page.get("Contents", [])
+            if obj["Key"].endswith(self._schema_suffix)
+        ]
+
+    def close(self):
+        self._batch_pool.shutdown(wait=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _s3_client(endpoint_url: str, max_pool_connections: int):
+    """
+    Get a boto3 S3 client for an endpoint.
+
+    As with _google_storage_client, clients are shared by all the backends in
+    a process with the same settings. Creating one loads botocore's service
+    models from disk and sets up a new connection pool, which is slow.
+    """
+    # boto3 is an optional dependency, and slow to import, so it's only loaded
+    # when an S3 backend is actually used.
+    import boto3
+    import botocore.config
+
+    client = boto3.session.Session().client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=botocore.config.Config(max_pool_connections=max_pool_connections),
+    )
+    client.meta.events.register("before-sign.s3.GetObject", _accept_gzip)
+    return client
+
+
+def _accept_gzip(request, **kwargs):
+    """
+    Mark an S3 request as accepting a gzipped response.
+
+    Without this, Google Cloud Storage decompresses objects stored with
+    Content-Encoding: gzip before sending them. Alerts are served still
+    gzipped, so they must be fetched as they are stored. botocore doesn't
+    decompress response bodies itself.
+    """
+    request.headers["Accept-Encoding"] = "gzip"
+
+
+def _get_alerts_concurrently(
+    pool: concurrent.futures.Executor,
+    get_alert: Callable[[str], bytes],
+    alert_ids: List[str],
+) -> Dict[str, bytes]:
+    """
+    Call get_alert for each of alert_ids on a thread pool, collecting the
+    alerts that were found.
+    """
+
+    def get_alert_if_exists(alert_id: str) -> Optional[bytes]:
+        try:
+            return get_alert(alert_id)
+        except NotFoundError:
+            return None
+
+    payloads = pool.map(get_alert_if_exists, alert_ids)
+    return {
+        alert_id: payload
+        for alert_id, payload in zip(alert_ids, payloads)
+        if payload is not None
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _google_storage_client(gcp_project: str, max_pool_connections: int):
+    """
+    Get a Google Cloud Storage client for a project.
+
+    Clients are shared by all the backends in a process with the same
+    settings, so that each doesn't set up its own credentials and connection
+    pool.
+    """
+    import google.cloud.storage as gcs
+    import requests.adapters
+
+    client = gcs.Client(project=gcp_project)
+    # The client's authorized session is a requests.Session, which keeps only
+    # 10 connections per host by default. Replace its adapter with one sized
+    # for the server's concurrency.
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=max_pool_connections,
+        pool_maxsize=max_pool_connections,
+    )
+    client._http.mount("https://", adapter)
+    return client
+
 
 class NotFoundError(Exception):
     """
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Rename alert and schema objects in Google Cloud Storage buckets to drop the
+leading "/" from their names.
+
+Older versions of the alert database wrote objects under names like
+"/alert_archive/v1/alerts/<id>.avro.gz". GCS treats the leading slash as part
+of the name, so those objects sit under an empty-named top-level folder. The
+server now reads "alert_archive/v1/alerts/<id>.avro.gz" instead.
+
+Each object is copied to its new name within the same bucket, and then the
+original is deleted. Objects which already exist under the new name aren't
+copied again, so the script can be re-run safely if it is interrupted. An
+original is only deleted once its copy's size and CRC32C checksum match it;
+any that don't are logged and left in place for someone to look at.
+
+For example:
+
+    python script/migrate_object_names.py --gcp-project=alert-stream \\
+        alert-packets alert-schemas
+"""
+
+import argparse
+import logging
+
+import google.cloud.storage as gcs
+
+logger = logging.getLogger(__name__)
+
+OLD_PREFIX = "/alert_archive/"
+NEW_PREFIX = "alert_archive/"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "migrate_object_names",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="Drop the leading slash from alert database object names.",
+    )
+    parser.add_argument("buckets", nargs="+", help="names of the buckets to migrate")
+    parser.add_argument(
+        "--gcp-project",
+        type=str,
+        required=True,
+        help="the name of the GCP project that owns the buckets",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only log what would be renamed",
+    )
+    parser.add_argument(
+        "--keep-old",
+        action="store_true",
+        help="copy objects to their new names without deleting the originals",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    client = gcs.Client(project=args.gcp_project)
+    for bucket_name in args.buckets:
+        migrate_bucket(client, bucket_name, args.dry_run, args.keep_old)
+
+
+def migrate_bucket(client: gcs.Client, bucket_name: str, dry_run: bool, keep_old: bool):
+    bucket = client.bucket(bucket_name)
+    renamed = 0
+    already_present = 0
+    skipped = 0
+    for blob in client.list_blobs(bucket, prefix=OLD_PREFIX):
+        new_name = blob.name.replace(OLD_PREFIX, NEW_PREFIX, 1)
+        if dry_run:
+            logger.info(
+                "would rename gs://%s/%s to %s", bucket_name, blob.name, new_name
+            )
+            continue
+        target = bucket.get_blob(new_name)
+        copied = target is None
+        if target is None:
+            target = bucket.copy_blob(blob, bucket, new_name)
+        if not same_contents(blob, target):
+            logger.warning(
+                "skipping gs://%s/%s: %s exists with different contents",
+                bucket_name,
+                blob.name,
+                new_name,
+            )
+            skipped += 1
+            continue
+        if not keep_old:
+            # Pinned to the generation that was compared, in case the original
+            # has been replaced since.
+            blob.delete(if_generation_match=blob.generation)
+        if copied:
+            renamed += 1
+        else:
+            already_present += 1
+    logger.info("renamed %d objects in gs://%s", renamed, bucket_name)
+    if already_present:
+        logger.info(
+            "%d objects in gs://%s had already been copied to their new names",
+            already_present,
+            bucket_name,
+        )
+    if skipped:
+        logger.warning(
+            "skipped %d objects in gs://%s whose new names hold something else",
+            skipped,
+            bucket_name,
+        )
+
+
+def same_contents(blob: gcs.Blob, other: gcs.Blob) -> bool:
+    """
+    Report whether two objects hold the same bytes, going by their metadata.
+
+    GCS keeps a CRC32C checksum for every object, composite or not, which
+    isn't true of MD5.
+    """
+    return blob.size == other.size and blob.crc32c == other.crc32c
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import gzip
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GCSTestData:
+    """The buckets set up for the integration tests."""
+
+    gcp_project: str
+    packet_bucket_name: str
+    schema_bucket_name: str
+
+
+@pytest.fixture(scope="session")
+def stored_alerts() -> Dict[str, bytes]:
+    """
+    The alerts stored in each integration test backend, uncompressed.
+
+    They don't have valid payloads, although they are stored gzipped like real
+    ones are.
+    """
+    return {
+        "alert-id-1": b"payload-1",
+        "alert-id-2": b"payload-2",
+        "alert-id-3": b"payload-3",
+    }
+
+
+@pytest.fixture(scope="session")
+def stored_schemas() -> Dict[str, bytes]:
+    """The schemas stored in each integration test backend."""
+    return {
+        "1": b"schema-payload-1",
+        "2": b"schema-payload-2",
+        "3": b"schema-payload-3",
+    }
+
+
+@pytest.fixture(scope="session")
+def gzip_encoded_alert_ids():
+    """
+    The stored alerts which are uploaded to Google Cloud Storage with
+    Content-Encoding: gzip.
+    """
+    return {"alert-id-3"}
+
+
+@pytest.fixture(scope="session")
+def gcs_test_data(stored_alerts, stored_schemas, gzip_encoded_alert_ids):
+    """
+    Create test buckets in Google Cloud Storage, and populate them with the
+    stored alerts and schemas.
+
+    This is done once for the whole test session, and cleaned up at the end
+    of it. Every backend which reads from Google Cloud Storage shares them.
+    """
+    gcp_project = os.environ.get("ALERTDB_TEST_GCP_PROJECT", None)
+    if gcp_project is None:
+        pytest.skip("the $ALERTDB_TEST_GCP_PROJECT environment variable must be set")
+
+    import google.cloud.storage as gcs
+
+    packet_bucket_name = "alertdb_server_integration_test_bucket_packets"
+    schema_bucket_name = "alertdb_server_integration_test_bucket_schemas"
+    client = gcs.Client(project=gcp_project)
+
+    def get_bucket(bucket_name):
+        # A run that was interrupted can leave its buckets behind; reuse them
+        # rather than failing to create them again.
+        bucket = client.lookup_bucket(bucket_name)
+        if bucket is None:
+            logger.info("creating bucket %s", bucket_name)
+            bucket = client.create_bucket(bucket_name)
+        return bucket
+
+    packet_bucket = get_bucket(packet_bucket_name)
+    schema_bucket = get_bucket(schema_bucket_name)
+
+    # Populate the test buckets with a few objects in the expected locations
+    blobs = []
+    for alert_id, alert_payload in stored_alerts.items():
+        blob = packet_bucket.blob(f"alert_archive/v1/alerts/{alert_id}.avro.gz")
+        logger.info("uploading blob %s", blob.name)
+        if alert_id in gzip_encoded_alert_ids:
+            # GCS decompresses objects like this when they're downloaded,
+            # unless asked not to; the backends must not let it.
+            blob.content_encoding = "gzip"
+        # N.B. this method is poorly named; it accepts bytes:
+        blob.upload_from_string(gzip.compress(alert_payload))
+        blobs.append(blob)
+    for schema_id, schema_payload in stored_schemas.items():
+        blob = schema_bucket.blob(f"alert_archive/v1/schemas/{schema_id}.json")
+        logger.info("uploading blob %s", blob.name)
+        blob.upload_from_string(schema_payload)
+        blobs.append(blob)
+
+    yield GCSTestData(
+        gcp_project=gcp_project,
+        packet_bucket_name=packet_bucket_name,
+        schema_bucket_name=schema_bucket_name,
+    )
+
+    for blob in blobs:
+        logger.info("deleting blob %s", blob.name)
+        blob.delete()
+    for bucket in (packet_bucket, schema_bucket):
+        logger.info("deleting bucket %s", bucket.name)
+        bucket.delete()
@@ -1,131 +1,109 @@
+import gzip
 import logging
 import os
-import unittest
 
-import google.cloud.storage as gcs
-import requests
+import pytest
 from fastapi.testclient import TestClient
 
 from alertdb.server import create_server
-from alertdb.storage import GoogleObjectStorageBackend
+from alertdb.storage import (
+    FileBackend,
+    GoogleObjectStorageBackend,
+    S3ObjectStorageBackend,
+)
 
 logger = logging.getLogger(__name__)
 logger.level = logging.DEBUG
 
 
-class ServerIntegrationTest(unittest.TestCase):
-    @classmethod
-    def setUpClass(cls):
-        """
-        Create a test bucket, and populate it with three alerts and three
-        schemas.
-
-        The alerts and schemas don't have valid payloads.
-        """
-        gcp_project = os.environ.get("ALERTDB_TEST_GCP_PROJECT", None)
-        if gcp_project is None:
-            raise unittest.SkipTest(
-                "the $ALERTDB_TEST_GCP_PROJECT environment variable must be set"
-            )
-        packet_bucket_name = "alertdb_server_integration_test_bucket_packets"
-        schema_bucket_name = "alertdb_server_integration_test_bucket_schemas"
-        client = gcs.Client(project=gcp_project)
-
-        logger.info("creating bucket %s", packet_bucket_name)
-        packet_bucket = client.create_bucket(packet_bucket_name)
-
-        def delete_packet_bucket():
-            logger.info("deleting bucket %s", packet_bucket_name)
-            packet_bucket.delete()
-
-        cls.addClassCleanup(delete_packet_bucket)
-
-        logger.info("creating bucket %s", schema_bucket_name)
-        schema_bucket = client.create_bucket(schema_bucket_name)
-
-        def delete_schema_bucket():
-            logger.info("deleting bucket %s", schema_bucket_name)
-            schema_bucket.delete()
-
-        cls.addClassCleanup(delete_schema_bucket)
-
-        # Populate the test bucket with a few objects in the expected locations
-        def delete_blob(blob):
-            # Callback to delete a blob during cleanup.
-            logger.info("deleting blob %s", blob.name)
-            blob.delete()
-
-        alerts = {
-            "alert-id-1": b"payload-1",
-            "alert-id-2": b"payload-2",
-            "alert-id-3": b"payload-3",
-        }
-        for alert_id, alert_payload in alerts.items():
-            blob = packet_bucket.blob(f"/alert_archive/v1/alerts/{alert_id}.avro.gz")
-            logger.info("uploading blob %s", blob.name)
-            # N.B. this method is poorly named; it accepts bytes:
-            blob.upload_from_string(alert_payload)
-            cls.addClassCleanup(delete_blob, blob)
-
-        schemas = {
-            "1": b"schema-payload-1",
-            "2": b"schema-payload-2",
-            "3": b"schema-payload-3",
-        }
-        for schema_id, schema_payload in schemas.items():
-            blob = schema_bucket.blob(f"/alert_archive/v1/schemas/{schema_id}.json")
-            logger.info("uploading blob %s", blob.name)
-            # N.B. this method is poorly named; it accepts bytes:
-            blob.upload_from_string(schema_payload)
-            cls.addClassCleanup(delete_blob, blob)
-
-        cls.gcp_project = gcp_project
-        cls.packet_bucket_name = packet_bucket_name
-        cls.schema_bucket_name = schema_bucket_name
-        cls.stored_alerts = alerts
-        cls.stored_schemas = schemas
-
-    def setUp(self):
-        """
-        Run a local instance of the server.
-        """
+@pytest.fixture(scope="module", params=["local-files", "google-cloud", "s3"])
+def backend(request, tmp_path_factory, stored_alerts, stored_schemas):
+    """
+    Pytest fixture for each kind of backend, holding the stored alerts and
+    schemas.
+
+    The object store backends read the same buckets, which are only set up
+    once. Each backend holds its client and connections, so one is shared by
+    all the tests.
+    """
+    if request.param == "local-files":
+        root = tmp_path_factory.mktemp("alertdb")
+        (root / "alerts").mkdir()
+        (root / "schemas").mkdir()
+        for alert_id, alert_payload in stored_alerts.items():
+            (root / "alerts" / alert_id).write_bytes(gzip.compress(alert_payload))
+        for schema_id, schema_payload in stored_schemas.items():
+            (root / "schemas" / schema_id).write_bytes(schema_payload)
+        backend = FileBackend(str(root))
+
+    elif request.param == "google-cloud":
+        gcs_test_data = request.getfixturevalue("gcs_test_data")
         backend = GoogleObjectStorageBackend(
-            self.gcp_project, self.packet_bucket_name, self.schema_bucket_name
+            gcs_test_data.gcp_project,
+            gcs_test_data.packet_bucket_name,
+            gcs_test_data.schema_bucket_name,
         )
-        self.server = create_server(backend)
-        self.client = TestClient(self.server)
-
-    def test_get_existing_alerts(self):
-        """Test that retrieving an alert over HTTP works as expected."""
-        for alert_id, alert in self.stored_alerts.items():
-            response = self._get_alert(alert_id)
-            self.assertEqual(response.status_code, 200)
-            self.assertEqual(response.content, alert)
-
-    def test_get_existing_schemas(self):
-        """Test that retrieving a schema over HTTP works as expected."""
-        for schema_id, schema in self.stored_schemas.items():
-            response = self._get_schema(schema_id)
-            self.assertEqual(response.status_code, 200)
-            self.assertEqual(response.content, schema)
-
-    def test_get_missing_alert(self):
-        """Test that retrieving an alert that does not exist gives a 404."""
-        response = self._get_alert("bogus")
-        self.assertEqual(response.status_code, 404)
-
-    def test_get_missing_schema(self):
-        """Test that retrieving a schema that does not exist gives a 404."""
-        response = self._get_schema("bogus")
-        self.assertEqual(response.status_code, 404)
-
-    def test_healthcheck(self):
-        """Test that the healthcheck endpoint returns 200."""
-        response = self.client.get("/v1/health")
-        self.assertEqual(response.status_code, 200)
-
-    def _get_alert(self, alert_id: str) -> requests.Response:
-        return self.client.get(f"/v1/alerts/{alert_id}")
-
-    def _get_schema(self, schema_id: str) -> requests.Response:
-        return self.client.get(f"/v1/schemas/{schema_id}")
+
+    elif request.param == "s3":
+        # This reads the same buckets through GCS's S3-compatible API, which
+        # needs an HMAC key.
+        pytest.importorskip("boto3")
+        if "AWS_ACCESS_KEY_ID" not in os.environ:
+            pytest.skip("the $AWS_ACCESS_KEY_ID environment variable must be set")
+        gcs_test_data = request.getfixturevalue("gcs_test_data")
+        backend = S3ObjectStorageBackend(
+            gcs_test_data.packet_bucket_name, gcs_test_data.schema_bucket_name
+        )
+
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def client(backend):
+    """Pytest fixture for a client of a fresh server, with empty caches."""
+    yield TestClient(create_server(backend))
+
+
+def test_get_existing_alerts(client, stored_alerts):
+    """Test that retrieving an alert over HTTP works as expected."""
+    for alert_id, alert in stored_alerts.items():
+        response = client.get(f"/v1/alerts/{alert_id}")
+        assert response.status_code == 200
+        # The server marks alerts as gzip-encoded, so the client has already
+        # decompressed them.
+        assert response.content == alert
+
+
+def test_stream_existing_alerts(backend, stored_alerts):
+    """
+    Test that streamed alerts are the stored gzipped bytes, whatever their
+    Content-Encoding.
+    """
+    for alert_id, alert in stored_alerts.items():
+        streamed = b"".join(backend.open_alert(alert_id))
+        assert streamed == backend.get_alert(alert_id)
+        assert gzip.decompress(streamed) == alert
+
+
+def test_get_existing_schemas(client, stored_schemas):
+    """Test that retrieving a schema over HTTP works as expected."""
+    for schema_id, schema in stored_schemas.items():
+        response = client.get(f"/v1/schemas/{schema_id}")
+        assert response.status_code == 200
+        assert response.content == schema
+
+
+def test_get_missing_alert(client):
+    """Test that retrieving an alert that does not exist gives a 404."""
+    assert client.get("/v1/alerts/bogus").status_code == 404
+
+
+def test_get_missing_schema(client):
+    """Test that retrieving a schema that does not exist gives a 404."""
+    assert client.get("/v1/schemas/bogus").status_code == 404
+
+
+def test_healthcheck(client):
+    """Test that the healthcheck endpoint returns 200."""
+    assert client.get("/v1/health").status_code == 200
@@ -1,8 +1,67 @@
+import email.parser
+import gzip
+import io
+import threading
+import time
+from typing import List
+
 import pytest
 from fastapi.testclient import TestClient
 
+import alertdb.server
 from alertdb.server import create_server
-from alertdb.storage import FileBackend
+from alertdb.storage import AlertDatabaseBackend, FileBackend, NotFoundError
+
+
+class MemoryBackend(AlertDatabaseBackend):
+    """A backend which serves alerts and schemas from dictionaries."""
+
+    def __init__(self):
+        self.alerts = {}
+        self.schemas = {}
+        self.retrieved_alerts = []
+
+    def get_alert(self, alert_id: str) -> bytes:
+        try:
+            alert = self.alerts[alert_id]
+        except KeyError as key_error:
+            raise NotFoundError("alert not found") from key_error
+        self.retrieved_alerts.append(alert_id)
+        return alert
+
+    def get_schema(self, schema_id: str) -> bytes:
+        try:
+            return self.schemas[schema_id]
+        except KeyError as key_error:
+            raise NotFoundError("schema not found") from key_error
+
+    def list_schemas(self) -> List[str]:
+        return list(self.schemas)
+
+
+def wait_until(condition, client=None, timeout=5):
+    """
+    Poll condition until it returns true, failing the test if that takes longer
+    than timeout seconds.
+
+    If a client is given, a health check is sent on every poll. Older versions
+    of Starlette's TestClient only run the server's event loop while they are
+    handling a request, so background tasks don't make progress without one.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for condition"
+        if client is not None:
+            client.get("/v1/health")
+        time.sleep(0.01)
+
+
+def prefetching_done(server):
+    """
+    Report whether the server's prefetch worker has finished with everything
+    it has been given, including putting the alerts in the cache.
+    """
+    return server.state.prefetch_queue._unfinished_tasks == 0
 
 
 @pytest.fixture
@@ -11,9 +70,484 @@ def file_backend(tmp_path):
     yield FileBackend(str(tmp_path))
 
 
+@pytest.fixture
+def memory_backend():
+    """Pytest fixture for a backend held in memory"""
+    yield MemoryBackend()
+
+
 def test_server_healthcheck(file_backend):
     """Test that the server responds on the healthcheck endpoint."""
     server = create_server(file_backend)
     client = TestClient(server)
     response = client.get("/v1/health")
     assert response.status_code == 200
+
+
+def test_server_closes_backend(memory_backend, monkeypatch):
+    """Test that the backend is closed when the server shuts down."""
+    closed = []
+    monkeypatch.setattr(memory_backend, "close", lambda: closed.append(True))
+    with TestClient(create_server(memory_backend)):
+        assert not closed
+    assert closed == [True]
+
+
+def test_server_caches_alerts(memory_backend):
+    """Test that alerts are served from memory once they have been fetched."""
+    memory_backend.alerts["alert-id"] = gzip.compress(b"payload")
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    response = client.get("/v1/alerts/alert-id")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == b"payload"
+
+    headers = response.headers
+
+    del memory_backend.alerts["alert-id"]
+    response = client.get("/v1/alerts/alert-id")
+    assert response.status_code == 200
+    assert response.content == b"payload"
+    for header in ("content-type", "content-encoding", "cache-control", "etag"):
+        assert response.headers[header] == headers[header]
+    assert response.headers["content-length"] == str(len(gzip.compress(b"payload")))
+
+
+def test_server_remembers_missing_alerts(memory_backend):
+    """Test that a missing alert stays missing until its TTL runs out."""
+    server = create_server(memory_backend, missing_alert_ttl=0.1)
+    client = TestClient(server)
+    assert client.get("/v1/alerts/alert-id").status_code == 404
+
+    memory_backend.alerts["alert-id"] = gzip.compress(b"payload")
+    assert client.get("/v1/alerts/alert-id").status_code == 404
+
+    time.sleep(0.2)
+    response = client.get("/v1/alerts/alert-id")
+    assert response.status_code == 200
+    assert response.content == b"payload"
+
+
+def test_server_remembers_missing_schemas(memory_backend):
+    """Test that a 404 for a schema is remembered, and cacheable by clients."""
+    server = create_server(memory_backend, missing_alert_ttl=60)
+    client = TestClient(server)
+    response = client.get("/v1/schemas/1")
+    assert response.status_code == 404
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+    memory_backend.schemas["1"] = b"{}"
+    assert client.get("/v1/schemas/1").status_code == 404
+
+
+def test_server_alert_cache_disabled(memory_backend):
+    """Test that a zero-byte alert cache always goes to the backend."""
+    memory_backend.alerts["alert-id"] = gzip.compress(b"payload")
+
+    server = create_server(memory_backend, alert_cache_bytes=0)
+    client = TestClient(server)
+    assert client.get("/v1/alerts/alert-id").status_code == 200
+
+    del memory_backend.alerts["alert-id"]
+    assert client.get("/v1/alerts/alert-id").status_code == 404
+
+
+def test_server_caches_schemas(memory_backend):
+    """Test that schemas are served from memory once they have been fetched."""
+    memory_backend.schemas["1"] = b"{}"
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    assert client.get("/v1/schemas/1").content == b"{}"
+
+    del memory_backend.schemas["1"]
+    response = client.get("/v1/schemas/1")
+    assert response.status_code == 200
+    assert response.content == b"{}"
+
+
+def test_server_serves_files(tmp_path, file_backend):
+    """Test that alerts in a file backend are sent from disk."""
+    alert_dir = tmp_path / "alerts"
+    alert_dir.mkdir()
+    (alert_dir / "alert-id").write_bytes(gzip.compress(b"payload"))
+
+    server = create_server(file_backend)
+    client = TestClient(server)
+    response = client.get("/v1/alerts/alert-id")
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == b"payload"
+
+    (alert_dir / "directory").mkdir()
+    assert client.get("/v1/alerts/bogus").status_code == 404
+    assert client.get("/v1/alerts/directory").status_code == 404
+
+
+def test_server_remembers_alert_files(tmp_path, file_backend, monkeypatch):
+    """Test that a file backend is only asked to find each alert once."""
+    alert_dir = tmp_path / "alerts"
+    alert_dir.mkdir()
+    (alert_dir / "alert-id").write_bytes(gzip.compress(b"payload"))
+
+    lookups = []
+    get_alert_file = file_backend.get_alert_file
+
+    def counting_get_alert_file(alert_id):
+        lookups.append(alert_id)
+        return get_alert_file(alert_id)
+
+    monkeypatch.setattr(file_backend, "get_alert_file", counting_get_alert_file)
+
+    server = create_server(file_backend)
+    client = TestClient(server)
+    for _ in range(3):
+        assert client.get("/v1/alerts/alert-id").content == b"payload"
+    assert lookups == ["alert-id"]
+
+
+def test_server_batch_get_alerts(tmp_path, file_backend):
+    """Test that many alerts can be retrieved in one multipart response."""
+    alert_dir = tmp_path / "alerts"
+    alert_dir.mkdir()
+    (alert_dir / "alert-id-1").write_bytes(b"payload-1")
+    (alert_dir / "alert-id-2").write_bytes(b"payload-2")
+
+    server = create_server(file_backend)
+    client = TestClient(server)
+    response = client.post(
+        "/v1/alerts:batchGet", json=["alert-id-2", "bogus", "alert-id-1"]
+    )
+    assert response.status_code == 200
+
+    header = f"Content-Type: {response.headers['content-type']}\r\n\r\n"
+    message = email.parser.BytesParser().parsebytes(header.encode() + response.content)
+    parts = [(p["Content-ID"], p.get_payload(decode=True)) for p in message.walk()]
+    assert parts[1:] == [
+        ("<alert-id-2>", b"payload-2"),
+        ("<alert-id-1>", b"payload-1"),
+    ]
+
+
+def test_server_batch_get_alerts_fetches_once(memory_backend, monkeypatch):
+    """Test that a batch asks the backend once, only for uncached alerts."""
+    for alert_id in ("alert-id-1", "alert-id-2", "alert-id-3"):
+        memory_backend.alerts[alert_id] = gzip.compress(alert_id.encode())
+
+    batches = []
+    get_alerts = memory_backend.get_alerts
+
+    def recording_get_alerts(alert_ids):
+        batches.append(alert_ids)
+        return get_alerts(alert_ids)
+
+    monkeypatch.setattr(memory_backend, "get_alerts", recording_get_alerts)
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    assert client.get("/v1/alerts/alert-id-1").status_code == 200
+    response = client.post(
+        "/v1/alerts:batchGet", json=["alert-id-1", "alert-id-2", "alert-id-3", "bogus"]
+    )
+    assert response.status_code == 200
+    assert batches == [["alert-id-2", "alert-id-3", "bogus"]]
+
+
+def test_server_rejects_escaping_ids(tmp_path):
+    """Test that IDs can't be used to read files outside the backend."""
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    root = tmp_path / "root"
+    (root / "alerts").mkdir(parents=True)
+
+    server = create_server(FileBackend(str(root)))
+    client = TestClient(server)
+    for alert_id in ("../../secret.txt", "/etc/hostname", "..\\x", ".hidden"):
+        response = client.post("/v1/alerts:batchGet", json=[alert_id])
+        assert response.status_code == 400
+    response = client.post("/v1/alerts:batchGet", json=["id\r\nX-Injected: 1"])
+    assert response.status_code == 400
+    assert client.get("/v1/alerts/..").status_code in (400, 404)
+    assert client.get("/v1/schemas/.secret").status_code == 400
+    # IDs go into the ETag header, so they must be ASCII.
+    assert client.get("/v1/alerts/%D9%A1%D9%A2").status_code == 400
+
+    backend = FileBackend(str(root))
+    for bad_id in ("../../secret.txt", "/etc/hostname", "..", "a\0b"):
+        with pytest.raises(NotFoundError):
+            backend.get_alert(bad_id)
+        with pytest.raises(NotFoundError):
+            backend.get_alert_file(bad_id)
+        with pytest.raises(NotFoundError):
+            backend.get_schema(bad_id)
+
+
+def test_server_batch_get_alerts_too_many(file_backend):
+    """Test that an oversized batch request is rejected."""
+    server = create_server(file_backend)
+    client = TestClient(server)
+    response = client.post("/v1/alerts:batchGet", json=["id"] * 1001)
+    assert response.status_code == 400
+
+
+def test_server_revalidates_alerts(memory_backend):
+    """Test that a client holding an alert's ETag gets a 304 response."""
+    memory_backend.alerts["alert-id"] = gzip.compress(b"payload")
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    response = client.get("/v1/alerts/alert-id")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+
+    # The backend isn't needed to answer a revalidation.
+    del memory_backend.alerts["alert-id"]
+    response = client.get("/v1/alerts/alert-id", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    response = client.get("/v1/alerts/other-id", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+
+def test_server_rejects_ids_that_break_etags(memory_backend):
+    """
+    Test that IDs which couldn't round-trip through a quoted ETag and an
+    If-None-Match list are rejected.
+    """
+    client = TestClient(create_server(memory_backend))
+    for bad_id in ('a"b', "a,b", "a%20b"):
+        assert client.get(f"/v1/alerts/{bad_id}").status_code == 400
+        assert client.get(f"/v1/schemas/{bad_id}").status_code == 400
+    response = client.post("/v1/alerts:batchGet", json=["a,b"])
+    assert response.status_code == 400
+
+
+def test_server_revalidates_schemas(memory_backend):
+    """Test that a client holding a schema's ETag gets a 304 response."""
+    memory_backend.schemas["1"] = b"{}"
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    etag = client.get("/v1/schemas/1").headers["etag"]
+    response = client.get("/v1/schemas/1", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+
+def test_server_wildcard_revalidation_needs_existence(memory_backend, file_backend):
+    """
+    Test that "If-None-Match: *" is only a 304 for alerts and schemas that
+    exist, and that nothing known to be missing is ever a 304.
+    """
+    memory_backend.alerts["alert-id"] = gzip.compress(b"payload")
+    memory_backend.schemas["1"] = b"{}"
+    wildcard = {"If-None-Match": "*"}
+
+    client = TestClient(create_server(memory_backend))
+    assert client.get("/v1/alerts/bogus", headers=wildcard).status_code == 404
+    assert client.get("/v1/schemas/bogus", headers=wildcard).status_code == 404
+    # Both on a cache miss, and then on a hit.
+    assert client.get("/v1/alerts/alert-id", headers=wildcard).status_code == 304
+    assert client.get("/v1/alerts/alert-id").status_code == 200
+    assert client.get("/v1/alerts/alert-id", headers=wildcard).status_code == 304
+    assert client.get("/v1/schemas/1", headers=wildcard).status_code == 304
+
+    # Now "bogus" is known to be missing, even a matching ETag isn't a 304.
+    response = client.get("/v1/alerts/bogus", headers={"If-None-Match": '"bogus"'})
+    assert response.status_code == 404
+    response = client.get("/v1/schemas/bogus", headers={"If-None-Match": '"bogus"'})
+    assert response.status_code == 404
+
+    client = TestClient(create_server(file_backend))
+    assert client.get("/v1/alerts/bogus", headers=wildcard).status_code == 404
+
+
+def test_server_prefetches_following_alerts(memory_backend):
+    """Test that a cache miss prefetches the alerts with the next IDs."""
+    for alert_id in ("0100", "0101", "0102", "0103"):
+        memory_backend.alerts[alert_id] = gzip.compress(alert_id.encode())
+
+    server = create_server(memory_backend, prefetch_stride=2)
+    with TestClient(server) as client:
+        assert client.get("/v1/alerts/0100").status_code == 200
+
+        wait_until(lambda: prefetching_done(server), client)
+        assert sorted(memory_backend.retrieved_alerts) == ["0100", "0101", "0102"]
+
+        # Prefetched alerts are served from the cache.
+        assert client.get("/v1/alerts/0101").content == b"0101"
+        assert memory_backend.retrieved_alerts.count("0101") == 1
+
+
+def test_server_serves_alerts_written_after_prefetch(memory_backend):
+    """
+    Test that a prefetch of an alert that doesn't exist yet doesn't stop it
+    being served once it's written.
+    """
+    memory_backend.alerts["0100"] = gzip.compress(b"0100")
+
+    server = create_server(memory_backend, prefetch_stride=2)
+    with TestClient(server) as client:
+        assert client.get("/v1/alerts/0100").status_code == 200
+        wait_until(lambda: prefetching_done(server), client)
+
+        memory_backend.alerts["0101"] = gzip.compress(b"0101")
+        response = client.get("/v1/alerts/0101")
+        assert response.status_code == 200
+        assert response.content == b"0101"
+
+
+def test_server_prefetch_worker_survives_errors(memory_backend, monkeypatch):
+    """Test that a failure while prefetching doesn't stop later prefetches."""
+    for alert_id in ("0100", "0200", "0201"):
+        memory_backend.alerts[alert_id] = gzip.compress(alert_id.encode())
+
+    following_ids = alertdb.server._following_ids
+
+    def broken_following_ids(alert_id, count):
+        if alert_id == "0100":
+            raise RuntimeError("broken")
+        return following_ids(alert_id, count)
+
+    monkeypatch.setattr(alertdb.server, "_following_ids", broken_following_ids)
+    server = create_server(memory_backend, prefetch_stride=1)
+    with TestClient(server) as client:
+        assert client.get("/v1/alerts/0100").status_code == 200
+        assert client.get("/v1/alerts/0200").status_code == 200
+
+        wait_until(lambda: prefetching_done(server), client)
+        assert "0201" in memory_backend.retrieved_alerts
+        assert not server.state.prefetch_task.done()
+
+
+def test_server_prefetches_listed_alerts(memory_backend):
+    """Test that alerts listed up front are fetched when the server starts."""
+    for alert_id in ("alert-id-1", "alert-id-2"):
+        memory_backend.alerts[alert_id] = gzip.compress(alert_id.encode())
+
+    server = create_server(
+        memory_backend, prefetch_alert_ids=["alert-id-1", "alert-id-2", "bogus"]
+    )
+    with TestClient(server) as client:
+        wait_until(server.state.warmup_task.done, client)
+
+        memory_backend.alerts.clear()
+        assert client.get("/v1/alerts/alert-id-1").content == b"alert-id-1"
+        assert client.get("/v1/alerts/alert-id-2").content == b"alert-id-2"
+
+
+def test_server_limits_listed_alert_prefetching(memory_backend, monkeypatch):
+    """
+    Test that alerts listed up front are fetched only a few at a time, leaving
+    most of the I/O pool free for requests.
+    """
+    alert_ids = [f"alert-id-{i}" for i in range(20)]
+    for alert_id in alert_ids:
+        memory_backend.alerts[alert_id] = gzip.compress(alert_id.encode())
+
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+    get_alert = memory_backend.get_alert
+
+    def slow_get_alert(alert_id):
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return get_alert(alert_id)
+
+    monkeypatch.setattr(memory_backend, "get_alert", slow_get_alert)
+    server = create_server(memory_backend, io_threads=8, prefetch_alert_ids=alert_ids)
+    with TestClient(server) as client:
+        wait_until(server.state.warmup_task.done, client)
+    assert sorted(memory_backend.retrieved_alerts) == sorted(alert_ids)
+    assert most_running <= 2
+
+
+def test_server_streams_alerts(memory_backend, monkeypatch):
+    """Test that alerts streamed in chunks are sent whole, then cached."""
+    payload = gzip.compress(b"payload" * 1000)
+    memory_backend.alerts["alert-id"] = payload
+
+    def open_alert(alert_id):
+        stream = io.BytesIO(memory_backend.get_alert(alert_id))
+        return iter(lambda: stream.read(100), b"")
+
+    monkeypatch.setattr(memory_backend, "open_alert", open_alert)
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    assert client.get("/v1/alerts/alert-id").content == b"payload" * 1000
+    assert client.get("/v1/alerts/bogus").status_code == 404
+
+    del memory_backend.alerts["alert-id"]
+    assert client.get("/v1/alerts/alert-id").content == b"payload" * 1000
+
+
+def test_server_sends_schemas_verbatim(memory_backend):
+    """Test that schema documents are sent byte-for-byte, not re-encoded."""
+    schema = b'{"type":  "record",\n "name": "alert"}'
+    memory_backend.schemas["1"] = schema
+
+    server = create_server(memory_backend)
+    client = TestClient(server)
+    response = client.get("/v1/schemas/1")
+    assert response.headers["content-type"] == "application/vnd.schemaregistry.v1+json"
+    assert response.content == schema
+
+
+def test_server_preloads_schemas(memory_backend):
+    """Test that all schemas are loaded into memory when the server starts."""
+    memory_backend.schemas["1"] = b"{}"
+    memory_backend.schemas["2"] = b"[]"
+
+    server = create_server(memory_backend)
+    with TestClient(server) as client:
+        memory_backend.schemas.clear()
+        assert client.get("/v1/schemas/1").content == b"{}"
+        assert client.get("/v1/schemas/2").content == b"[]"
+
+
+def test_server_preloads_readable_schemas(memory_backend, monkeypatch):
+    """Test that one schema failing to preload doesn't stop the others."""
+    memory_backend.schemas["1"] = b"{}"
+    memory_backend.schemas["2"] = b"[]"
+    get_schema = memory_backend.get_schema
+
+    def broken_get_schema(schema_id):
+        if schema_id == "1":
+            raise IsADirectoryError(schema_id)
+        return get_schema(schema_id)
+
+    monkeypatch.setattr(memory_backend, "get_schema", broken_get_schema)
+    server = create_server(memory_backend)
+    with TestClient(server) as client:
+        memory_backend.schemas.clear()
+        assert client.get("/v1/schemas/2").content == b"[]"
+
+
+def test_file_backend_lists_only_schema_files(tmp_path):
+    """Test that a file backend doesn't list directories or dotfiles."""
+    schema_dir = tmp_path / "schemas"
+    (schema_dir / "subdir").mkdir(parents=True)
+    (schema_dir / ".hidden").write_bytes(b"{}")
+    (schema_dir / "1").write_bytes(b"{}")
+
+    assert FileBackend(str(tmp_path)).list_schemas() == ["1"]
+
+
+def test_file_backend_streams_alerts(tmp_path):
+    """Test that a file backend can stream an alert in chunks."""
+    alert_dir = tmp_path / "alerts"
+    alert_dir.mkdir()
+    (alert_dir / "alert-id").write_bytes(b"0123456789")
+
+    backend = FileBackend(str(tmp_path), stream_chunk_size=4)
+    assert list(backend.open_alert("alert-id")) == [b"0123", b"4567", b"89"]
+    with pytest.raises(NotFoundError):
+        backend.open_alert("bogus")
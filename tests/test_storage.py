@@ -0,0 +1,298 @@
+import concurrent.futures
+import gzip
+import io
+from typing import Dict, List, Optional, Tuple
+
+import google.api_core.exceptions as google_exceptions
+import pytest
+
+import alertdb.storage
+from alertdb.storage import (
+    GoogleObjectStorageBackend,
+    NotFoundError,
+    S3ObjectStorageBackend,
+)
+
+
+class FakeBlob:
+    """
+    A stand-in for a Google Cloud Storage blob, serving ranges of its stored
+    bytes the way download_as_bytes does.
+    """
+
+    def __init__(self, data: Optional[bytes], generation: int = 1):
+        self.data = data
+        self.generation: Optional[int] = None
+        self._stored_generation = generation
+        self.size: Optional[int] = None
+        self.ranges: List[Tuple[int, int, Optional[int]]] = []
+
+    def download_as_bytes(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        raw_download: bool = False,
+        if_generation_match: Optional[int] = None,
+    ) -> bytes:
+        assert raw_download, "downloads must not be transcoded"
+        if self.data is None:
+            raise google_exceptions.NotFound("no such object")
+        if if_generation_match not in (None, self._stored_generation):
+            raise google_exceptions.PreconditionFailed("generation changed")
+        if start >= len(self.data):
+            raise google_exceptions.RequestRangeNotSatisfiable("past the end")
+        assert end is not None
+        self.ranges.append((start, end, if_generation_match))
+        # Like the real thing, a download fills in the object's generation.
+        self.generation = self._stored_generation
+        stop = end + 1
+        return self.data[start:stop]
+
+    def reload(self, if_generation_match: Optional[int] = None):
+        if self.data is None:
+            raise google_exceptions.NotFound("no such object")
+        if if_generation_match not in (None, self._stored_generation):
+            raise google_exceptions.PreconditionFailed("generation changed")
+        self.size = len(self.data)
+        self.generation = self._stored_generation
+
+
+class FakeBucket:
+    def __init__(self, blobs: Dict[str, FakeBlob]):
+        self.blobs = blobs
+
+    def blob(self, name: str) -> FakeBlob:
+        return self.blobs.setdefault(name, FakeBlob(None))
+
+
+def fake_gcs_backend(alerts: Dict[str, FakeBlob], **kwargs):
+    """
+    Make a GoogleObjectStorageBackend that reads alerts from fake blobs,
+    without a client.
+    """
+    backend = GoogleObjectStorageBackend.__new__(GoogleObjectStorageBackend)
+    backend._not_found_error = google_exceptions.NotFound
+    backend._range_not_satisfiable_error = google_exceptions.RequestRangeNotSatisfiable
+    backend.packet_bucket = FakeBucket(
+        {
+            f"alert_archive/v1/alerts/{alert_id}.avro.gz": blob
+            for alert_id, blob in alerts.items()
+        }
+    )
+    backend.stream_chunk_size = kwargs.get("stream_chunk_size", 1024 * 1024)
+    backend.parallel_chunk_size = kwargs.get("parallel_chunk_size", None)
+    backend._batch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    backend._download_pool = None
+    if backend.parallel_chunk_size is not None:
+        backend._download_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    return backend
+
+
+@pytest.mark.parametrize("size", [0, 1, 9, 10, 11, 35])
+def test_gcs_open_alert_streams_stored_bytes(size):
+    """
+    Test that GCS alerts are streamed in raw ranges which join up to the
+    stored object, with every range after the first pinned to its generation.
+    """
+    data = bytes(range(size))
+    blob = FakeBlob(data, generation=7)
+    backend = fake_gcs_backend({"alert-id": blob}, stream_chunk_size=10)
+
+    chunks = list(backend.open_alert("alert-id"))
+    assert b"".join(chunks) == data
+    assert all(len(chunk) == 10 for chunk in chunks[:-1])
+    assert [generation for _, _, generation in blob.ranges[1:]] == [7] * (
+        len(blob.ranges) - 1
+    )
+
+
+def test_gcs_open_alert_keeps_gzip_encoding():
+    """
+    Test that an alert stored with Content-Encoding: gzip is streamed still
+    compressed.
+    """
+    stored = gzip.compress(b"payload" * 100)
+    backend = fake_gcs_backend({"alert-id": FakeBlob(stored)}, stream_chunk_size=16)
+    assert b"".join(backend.open_alert("alert-id")) == stored
+
+
+def test_gcs_open_alert_missing():
+    """Test that streaming a missing GCS alert raises NotFoundError at once."""
+    backend = fake_gcs_backend({})
+    with pytest.raises(NotFoundError):
+        backend.open_alert("bogus")
+
+
+@pytest.mark.parametrize("size", [0, 9, 10, 11, 35])
+def test_gcs_get_alert_downloads_ranges_in_parallel(size):
+    """
+    Test that GCS alerts downloaded in parallel ranges join up to the stored
+    object, with every range after the first pinned to its generation.
+    """
+    data = bytes(range(size))
+    blob = FakeBlob(data, generation=7)
+    backend = fake_gcs_backend({"alert-id": blob}, parallel_chunk_size=10)
+    try:
+        assert backend.get_alert("alert-id") == data
+    finally:
+        backend.close()
+
+    assert sorted(start for start, _, _ in blob.ranges) == list(range(0, size, 10))
+    assert [generation for start, _, generation in blob.ranges if start > 0] == (
+        [7] * (len(blob.ranges) - 1)
+    )
+
+
+def test_gcs_close_shuts_down_pools():
+    """Test that closing a GCS backend shuts down its thread pools."""
+    backend = fake_gcs_backend({}, parallel_chunk_size=10)
+    backend.close()
+    for pool in (backend._batch_pool, backend._download_pool):
+        with pytest.raises(RuntimeError):
+            pool.submit(print)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """
+    Pytest fixture for a fresh S3 client, set up the way the backend's own
+    clients are, with dummy credentials. It's also handed to any
+    S3ObjectStorageBackend made while it's in use.
+    """
+    pytest.importorskip("boto3")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    client = alertdb.storage._s3_client.__wrapped__("https://storage.example.com", 1)
+    monkeypatch.setattr(
+        alertdb.storage, "_s3_client", lambda endpoint_url, pool_size: client
+    )
+    return client
+
+
+@pytest.fixture
+def stubbed_s3_backend(s3_client):
+    """
+    Pytest fixture for an S3ObjectStorageBackend whose client is stubbed out
+    with botocore's Stubber, so it makes no requests.
+    """
+    import botocore.stub
+
+    backend = S3ObjectStorageBackend("packets", "schemas", stream_chunk_size=10)
+    with botocore.stub.Stubber(s3_client) as stubber:
+        yield backend, stubber
+        stubber.assert_no_pending_responses()
+    backend.close()
+
+
+class FakeRawResponse(io.BytesIO):
+    """An HTTP response body, as botocore reads it from urllib3."""
+
+    def stream(self, amt=1024, decode_content=None):
+        chunk = self.read(amt)
+        while chunk:
+            yield chunk
+            chunk = self.read(amt)
+
+
+def s3_body(data: bytes):
+    import botocore.response
+
+    return botocore.response.StreamingBody(io.BytesIO(data), len(data))
+
+
+def test_s3_missing_objects(stubbed_s3_backend):
+    """Test that S3's NoSuchKey errors are reported as NotFoundError."""
+    backend, stubber = stubbed_s3_backend
+    alert_params = {"Bucket": "packets", "Key": "alert_archive/v1/alerts/bogus.avro.gz"}
+    schema_params = {"Bucket": "schemas", "Key": "alert_archive/v1/schemas/bogus.json"}
+    for params in (alert_params, alert_params, schema_params):
+        stubber.add_client_error(
+            "get_object",
+            service_error_code="NoSuchKey",
+            http_status_code=404,
+            expected_params=params,
+        )
+
+    with pytest.raises(NotFoundError):
+        backend.get_alert("bogus")
+    with pytest.raises(NotFoundError):
+        backend.open_alert("bogus")
+    with pytest.raises(NotFoundError):
+        backend.get_schema("bogus")
+
+
+def test_s3_asks_for_stored_bytes(s3_client):
+    """
+    Test that objects are requested with Accept-Encoding: gzip, so that GCS
+    doesn't decompress alerts stored with Content-Encoding: gzip.
+    """
+    import botocore.awsrequest
+
+    stored = gzip.compress(b"payload")
+    sent = []
+
+    def send(request, **kwargs):
+        # Answer the request here, after it has been signed, instead of over
+        # the network.
+        sent.append(request)
+        return botocore.awsrequest.AWSResponse(
+            request.url,
+            200,
+            {"Content-Length": str(len(stored)), "Content-Encoding": "gzip"},
+            FakeRawResponse(stored),
+        )
+
+    s3_client.meta.events.register("before-send.s3.GetObject", send)
+    backend = S3ObjectStorageBackend("packets", "schemas")
+    try:
+        assert backend.get_alert("alert-id") == stored
+        assert b"".join(backend.open_alert("alert-id")) == stored
+    finally:
+        backend.close()
+    assert [request.headers["Accept-Encoding"] for request in sent] == [b"gzip"] * 2
+
+
+def test_s3_open_alert_streams_chunks(stubbed_s3_backend):
+    """Test that S3 alerts are streamed in chunks of stream_chunk_size."""
+    backend, stubber = stubbed_s3_backend
+    data = bytes(range(35))
+    stubber.add_response(
+        "get_object",
+        {"Body": s3_body(data), "ContentLength": len(data)},
+        {"Bucket": "packets", "Key": "alert_archive/v1/alerts/alert-id.avro.gz"},
+    )
+
+    chunks = list(backend.open_alert("alert-id"))
+    assert b"".join(chunks) == data
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 5]
+
+
+def test_s3_list_schemas_follows_pages(stubbed_s3_backend):
+    """Test that listing schemas reads every page of the bucket listing."""
+    backend, stubber = stubbed_s3_backend
+    prefix = "alert_archive/v1/schemas/"
+    stubber.add_response(
+        "list_objects_v2",
+        {
+            "IsTruncated": True,
+            "NextContinuationToken": "page-2",
+            "Contents": [{"Key": prefix + "1.json"}, {"Key": prefix + "README"}],
+        },
+        {"Bucket": "schemas", "Prefix": prefix},
+    )
+    stubber.add_response(
+        "list_objects_v2",
+        {"IsTruncated": False, "Contents": [{"Key": prefix + "2.json"}]},
+        {"Bucket": "schemas", "Prefix": prefix, "ContinuationToken": "page-2"},
+    )
+
+    assert sorted(backend.list_schemas()) == ["1", "2"]
+
+
+def test_s3_close_shuts_down_pool(stubbed_s3_backend):
+    """Test that closing an S3 backend shuts down its batch pool."""
+    backend, _ = stubbed_s3_backend
+    backend.close()
+    with pytest.raises(RuntimeError):
+        backend._batch_pool.submit(print)